@@ -0,0 +1,283 @@
+"""
+Load generator for the agent's WebSocket endpoint.
+
+Virtual users send prompts from a corpus concurrently, answer tool permission
+requests with a fixed policy and report latency percentiles, time to first
+event and error rates.
+
+Usage:
+    uv run python client/load_test.py [--users N] [--requests N] [--rate R]
+        [--prompts FILE] [--permissions approve|deny] [--reuse]
+        [--url ws://localhost:8080/ws] [--runtime-arn ARN]
+
+    # Against a built-in stub agent (no agent or API key required)
+    uv run python client/load_test.py --stub
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import json
+import random
+import statistics
+import time
+import uuid
+from pathlib import Path
+
+import websockets
+from websocket_client import connect
+
+DEFAULT_PROMPTS = [
+    "What is 5 + 3?",
+    "Multiply 12 by 34.",
+    "Sum the numbers 1, 2, 3, 4 and 5.",
+    "Say hello in three languages.",
+]
+
+
+@dataclasses.dataclass
+class TurnResult:
+    """Outcome of one prompt."""
+
+    started: float
+    # Seconds from sending the prompt (None until received)
+    first_event: float | None = None
+    latency: float | None = None
+    # Seconds between the scheduled arrival and sending the prompt
+    queue_wait: float = 0.0
+    permission_requests: int = 0
+    error: str | None = None
+
+
+def load_prompts(path: Path | None) -> list[str]:
+    """Read one prompt per line (.txt) or {"prompt": ...} objects (.jsonl)."""
+    if path is None:
+        return DEFAULT_PROMPTS
+    prompts = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        prompts.append(json.loads(line)["prompt"] if path.suffix == ".jsonl" else line)
+    if not prompts:
+        raise ValueError(f"No prompts in {path}")
+    return prompts
+
+
+async def run_turn(websocket, prompt: str, approve: bool, timeout: float) -> TurnResult:
+    """Send one prompt and consume frames until turn_complete."""
+    result = TurnResult(started=time.perf_counter())
+    await websocket.send(json.dumps({"prompt": prompt}))
+    async with asyncio.timeout(timeout):
+        async for message in websocket:
+            elapsed = time.perf_counter() - result.started
+            if result.first_event is None:
+                result.first_event = elapsed
+            data = json.loads(message)
+
+            if "error" in data:
+                result.error = str(data["error"])
+                return result
+
+            if data.get("type") == "tool_permission_request":
+                result.permission_requests += 1
+                await websocket.send(
+                    json.dumps(
+                        {
+                            "type": "tool_permission_response",
+                            "request_id": data.get("request_id"),
+                            "approved": approve,
+                            "scope": "once",
+                        }
+                    )
+                )
+
+            elif data.get("type") == "turn_complete":
+                result.latency = elapsed
+                return result
+
+    result.error = "Connection closed before turn_complete"
+    return result
+
+
+async def virtual_user(
+    args: argparse.Namespace,
+    jobs: asyncio.Queue[tuple[str, float] | None],
+    results: list[TurnResult],
+) -> None:
+    """
+    Take prompts from jobs until the None sentinel.
+
+    With --reuse the connection (and its conversation) is kept for all
+    prompts and only reopened after an error; otherwise every prompt opens a
+    new connection and starts a new conversation.
+    """
+    # One runtime session per user, so AWS routes a user to one MicroVM
+    agent_session_id = str(uuid.uuid4())
+    approve = args.permissions == "approve"
+    connection = contextlib.AsyncExitStack()
+    websocket = None
+    try:
+        while (job := await jobs.get()) is not None:
+            prompt, arrival = job
+            queue_wait = time.perf_counter() - arrival
+            try:
+                if websocket is None:
+                    websocket = await connection.enter_async_context(
+                        connect(args.url, agent_session_id, args.runtime_arn)
+                    )
+                result = await run_turn(websocket, prompt, approve, args.timeout)
+            except Exception as e:
+                result = TurnResult(started=arrival, error=f"{type(e).__name__}: {e}")
+            result.queue_wait = queue_wait
+            results.append(result)
+
+            if result.error or not args.reuse:
+                with contextlib.suppress(Exception):
+                    await connection.aclose()
+                websocket = None
+    finally:
+        with contextlib.suppress(Exception):
+            await connection.aclose()
+
+
+async def dispatch(
+    args: argparse.Namespace,
+    prompts: list[str],
+    jobs: asyncio.Queue[tuple[str, float] | None],
+) -> None:
+    """
+    Enqueue --requests prompts, then one sentinel per user.
+
+    With --rate prompts arrive as a Poisson process (open model: latency
+    includes waiting for a free user); otherwise all are enqueued at once
+    and users send back to back (closed model).
+    """
+    for index in range(args.requests):
+        if args.rate and index:
+            await asyncio.sleep(random.expovariate(args.rate))
+        await jobs.put((prompts[index % len(prompts)], time.perf_counter()))
+    for _ in range(args.users):
+        await jobs.put(None)
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def report(results: list[TurnResult], duration: float, open_model: bool) -> None:
+    """Print the summary of a run (queue waits only for an arrival rate)."""
+    errors = [r for r in results if r.error]
+    print(f"\nrequests:     {len(results)} in {duration:.1f}s")
+    print(f"throughput:   {len(results) / duration:.2f} req/s")
+    print(
+        f"errors:       {len(errors)} "
+        f"({len(errors) / len(results) * 100 if results else 0:.1f}%)"
+    )
+    print(f"permissions:  {sum(r.permission_requests for r in results)} requests")
+
+    series = {
+        "latency": [r.latency for r in results if r.latency is not None],
+        "first_event": [r.first_event for r in results if r.first_event is not None],
+    }
+    if open_model:
+        series["queue_wait"] = [r.queue_wait for r in results]
+    print(f"\n{'ms':<12} {'p50':>8} {'p90':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for name, values in series.items():
+        if not values:
+            continue
+        cells = [percentile(values, q) for q in (0.5, 0.9, 0.95, 0.99)]
+        cells.append(max(values))
+        print(f"{name:<12} " + " ".join(f"{v * 1000:8.0f}" for v in cells))
+    if series["latency"]:
+        print(f"mean latency {statistics.fmean(series['latency']) * 1000:.0f} ms")
+
+    if errors:
+        print("\nerrors by message:")
+        counts = collections.Counter(r.error for r in errors)
+        for message, count in counts.most_common(5):
+            print(f"  {count:5d}  {message}")
+
+
+async def stub_agent(websocket) -> None:
+    """
+    Minimal agent speaking the WebSocket protocol of src/main.py.
+
+    Every prompt streams a few text events after a short delay; prompts
+    mentioning numbers first ask for a tool permission.
+    """
+    session_id = str(uuid.uuid4())
+    async for message in websocket:
+        data = json.loads(message)
+        if data.get("type") == "tool_permission_response":
+            continue
+        prompt = data.get("prompt", "")
+        await asyncio.sleep(random.uniform(0.05, 0.2))
+        if any(ch.isdigit() for ch in prompt):
+            await websocket.send(
+                json.dumps(
+                    {
+                        "type": "tool_permission_request",
+                        "request_id": str(uuid.uuid4()),
+                        "tool_name": "mcp__tools__add_numbers",
+                        "input": {},
+                    }
+                )
+            )
+            await websocket.recv()
+        for word in ("Stub", " reply", " to: ", prompt):
+            await websocket.send(json.dumps({"event": word}))
+            await asyncio.sleep(0.01)
+        await websocket.send(json.dumps({"result": "💰 Cost: $0"}))
+        await websocket.send(
+            json.dumps({"type": "turn_complete", "session_id": session_id})
+        )
+
+
+async def main(args: argparse.Namespace) -> None:
+    prompts = load_prompts(args.prompts)
+    jobs: asyncio.Queue[tuple[str, float] | None] = asyncio.Queue()
+    results: list[TurnResult] = []
+
+    stub = None
+    if args.stub:
+        stub = await websockets.serve(stub_agent, "127.0.0.1", 0)
+        args.url = f"ws://127.0.0.1:{stub.sockets[0].getsockname()[1]}/ws"
+
+    print(
+        f"Load test: {args.url} users={args.users} requests={args.requests} "
+        f"rate={args.rate or 'closed'} reuse={args.reuse} "
+        f"permissions={args.permissions}"
+    )
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(
+            dispatch(args, prompts, jobs),
+            *(virtual_user(args, jobs, results) for _ in range(args.users)),
+        )
+    finally:
+        if stub:
+            stub.close()
+    report(results, time.perf_counter() - started, open_model=bool(args.rate))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default="ws://localhost:8080/ws")
+    parser.add_argument("--runtime-arn", help="Sign AWS URLs for this runtime")
+    parser.add_argument("--users", type=int, default=4, help="Virtual users")
+    parser.add_argument("--requests", type=int, default=20, help="Total prompts")
+    parser.add_argument(
+        "--rate", type=float, default=0.0, help="Arrivals per second (0 = closed)"
+    )
+    parser.add_argument("--prompts", type=Path, help="Prompt corpus (.txt/.jsonl)")
+    parser.add_argument("--permissions", choices=["approve", "deny"], default="approve")
+    parser.add_argument(
+        "--reuse", action="store_true", help="Keep one connection per user"
+    )
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per prompt")
+    parser.add_argument("--stub", action="store_true", help="Run a stub agent")
+    asyncio.run(main(parser.parse_args()))
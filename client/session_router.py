@@ -0,0 +1,181 @@
+"""
+Session affinity: route Claude sessions to the runtime session that ran them.
+
+Follow-up turns sent with the runtime session (MicroVM) of the previous turn
+find the session jsonl already on disk instead of restoring it on a cold
+MicroVM. Routes are persisted in a local JSON file.
+
+Usage (for the HTTP path, e.g. `agentcore invoke --session-id`):
+    python client/session_router.py route [claude_session_id]
+    python client/session_router.py record <claude_session_id> <agent_session_id>
+
+    # Pass invoke output through, recording the session of its turn_complete
+    agentcore invoke ... | python client/session_router.py record-output <agent_id>
+"""
+
+import dataclasses
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+DEFAULT_PATH = Path.home() / ".cache" / "agentcore" / "session_routes.json"
+
+# Runtime defaults, see docs/microvm-lifecycle.md
+IDLE_TIMEOUT = 900.0
+MAX_LIFETIME = 28800.0
+
+# {"type": "turn_complete", "session_id": "..."} printed as JSON or repr
+TURN_COMPLETE_PATTERN = re.compile(
+    r"""["']type["']:\s*["']turn_complete["'],\s*"""
+    r"""["']session_id["']:\s*["']([^"']+)["']"""
+)
+
+
+@dataclasses.dataclass
+class Route:
+    """The runtime session a Claude session last ran on (wall-clock times)."""
+
+    agent_session_id: str
+    created: float
+    last_used: float
+
+
+class SessionRouter:
+    """
+    Persistent LRU map from Claude session ID to runtime session ID.
+
+    A route is dropped once its MicroVM has been idle for idle_timeout
+    seconds or alive for max_lifetime seconds, since it no longer holds the
+    session; at most max_entries routes are kept. The file is re-read before
+    every change, last writer wins between processes.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_PATH,
+        max_entries: int = 1000,
+        idle_timeout: float = IDLE_TIMEOUT,
+        max_lifetime: float = MAX_LIFETIME,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self._routes: OrderedDict[str, Route] = OrderedDict()
+
+    def lookup(self, claude_session_id: str) -> str | None:
+        """Return the runtime session that is still warm for the session."""
+        self._load()
+        route = self._routes.get(claude_session_id)
+        return route.agent_session_id if route else None
+
+    def route(self, claude_session_id: str | None = None) -> tuple[str, bool]:
+        """
+        Return (agent_session_id, warm) to send a turn of claude_session_id to.
+
+        Without a warm route a new runtime session ID is created; the route is
+        recorded (and its idle timer restarted) in both cases.
+        """
+        if claude_session_id:
+            agent_session_id = self.lookup(claude_session_id)
+            if agent_session_id:
+                self.record(claude_session_id, agent_session_id)
+                return agent_session_id, True
+        agent_session_id = str(uuid.uuid4())
+        if claude_session_id:
+            self.record(claude_session_id, agent_session_id)
+        return agent_session_id, False
+
+    def record(self, claude_session_id: str, agent_session_id: str) -> None:
+        """Remember that claude_session_id just ran on agent_session_id."""
+        self._load()
+        now = time.time()
+        # The MicroVM's lifetime started with the first turn sent to it
+        created = next(
+            (
+                r.created
+                for r in self._routes.values()
+                if r.agent_session_id == agent_session_id
+            ),
+            now,
+        )
+        self._routes[claude_session_id] = Route(agent_session_id, created, now)
+        self._routes.move_to_end(claude_session_id)
+        # Other Claude sessions on the same MicroVM kept it busy as well
+        for route in self._routes.values():
+            if route.agent_session_id == agent_session_id:
+                route.last_used = now
+        while len(self._routes) > self.max_entries:
+            self._routes.popitem(last=False)
+        self._save()
+
+    def _expired(self, route: Route, now: float) -> bool:
+        return (
+            now - route.last_used > self.idle_timeout
+            or now - route.created > self.max_lifetime
+        )
+
+    def _load(self) -> None:
+        try:
+            entries = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            entries = {}
+        now = time.time()
+        routes = ((key, Route(**value)) for key, value in entries.items())
+        self._routes = OrderedDict(
+            (key, route) for key, route in routes if not self._expired(route, now)
+        )
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        entries = {key: dataclasses.asdict(r) for key, r in self._routes.items()}
+        tmp.write_text(json.dumps(entries))
+        os.replace(tmp, self.path)
+
+
+def get_router() -> SessionRouter:
+    """Router configured from env (SESSION_ROUTES_PATH, AGENT_IDLE_TIMEOUT)."""
+    path = os.getenv("SESSION_ROUTES_PATH")
+    return SessionRouter(
+        path=Path(path) if path else DEFAULT_PATH,
+        idle_timeout=float(os.getenv("AGENT_IDLE_TIMEOUT", str(IDLE_TIMEOUT))),
+        max_lifetime=float(os.getenv("AGENT_MAX_LIFETIME", str(MAX_LIFETIME))),
+    )
+
+
+def record_output(router: SessionRouter, agent_session_id: str) -> str | None:
+    """
+    Echo stdin to stdout and record the Claude session of the last
+    turn_complete on agent_session_id; return that session ID.
+    """
+    claude_session_id = None
+    for line in sys.stdin:
+        sys.stdout.write(line)
+        sys.stdout.flush()
+        for match in TURN_COMPLETE_PATTERN.finditer(line):
+            claude_session_id = match.group(1)
+    if claude_session_id:
+        router.record(claude_session_id, agent_session_id)
+    return claude_session_id
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "route":
+        claude_session_id = sys.argv[2] if len(sys.argv) > 2 else None
+        print(get_router().route(claude_session_id or None)[0])
+    elif command == "record" and len(sys.argv) == 4:
+        get_router().record(sys.argv[2], sys.argv[3])
+    elif command == "record-output" and len(sys.argv) == 3:
+        record_output(get_router(), sys.argv[2])
+    else:
+        print("Usage: python session_router.py route [claude_session_id]")
+        print("       python session_router.py record <claude_id> <agent_id>")
+        print("       python session_router.py record-output <agent_id>")
+        sys.exit(1)
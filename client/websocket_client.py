@@ -4,11 +4,18 @@ Simple CLI tool for sending messages to the agent.
 """
 
 import asyncio
+import contextlib
 import json
+import re
 import sys
+import time
 import uuid
+from collections.abc import AsyncIterator
 
 import websockets
+from session_router import get_router
+from websockets.asyncio.client import ClientConnection
+from websockets.protocol import State
 
 try:
     from bedrock_agentcore.runtime import AgentCoreRuntimeClient
@@ -27,7 +34,10 @@ async def send_message(
 ):
     """
     Send a single message to the agent and receive streaming responses.
-    Connection is automatically closed after receiving all responses.
+
+    The connection is shared with later prompts to the same agent and
+    Claude session from this process (see ConnectionManager) and is closed
+    if the turn did not complete.
 
     Args:
         ws_url: WebSocket URL
@@ -36,6 +46,13 @@ async def send_message(
         agent_session_id: Optional AgentCore Runtime session ID
         runtime_arn: Optional runtime ARN for AWS authentication
     """
+    # Send follow-up turns to the MicroVM that already has the session
+    router = get_router()
+    if not agent_session_id and session_id:
+        agent_session_id = router.lookup(session_id)
+        if agent_session_id:
+            print(f"🎯 Warm Agent Session ID: {agent_session_id}\n")
+
     if not agent_session_id:
         agent_session_id = str(uuid.uuid4())
         print(f"🆔 Agent Session ID: {agent_session_id}\n")
@@ -43,56 +60,185 @@ async def send_message(
     if session_id:
         print(f"🔄 Claude Session ID: {session_id}\n")
 
+    if is_aws_url(ws_url) and runtime_arn:
+        print("🔐 Connecting with AWS SigV4 authentication...")
+
     try:
-        # Check if this is an AWS connection (wss://)
-        is_aws = ws_url.startswith("wss://bedrock-agentcore")
+        async with connections.lease(
+            ws_url, agent_session_id, runtime_arn, session_id
+        ) as ws:
+            complete = await _handle_websocket(ws, prompt, session_id)
+            if complete is None:
+                await connections.discard(ws_url, agent_session_id, session_id)
+            elif not session_id and complete.get("session_id"):
+                await connections.adopt(
+                    ws_url, agent_session_id, complete["session_id"]
+                )
+        if complete and complete.get("session_id"):
+            router.record(complete["session_id"], agent_session_id)
 
-        if is_aws and runtime_arn and HAS_AGENTCORE:
-            # Use AWS authentication for production
-            print("🔐 Connecting with AWS SigV4 authentication...")
+    except ConnectionRefusedError:
+        print("❌ Connection refused. Make sure the agent is running locally.")
+        print("   Run: uv run agentcore dev")
+    except Exception as e:
+        print(f"❌ Error: {e}")
 
-            # Extract region from URL
-            # wss://bedrock-agentcore.ap-northeast-1.amazonaws.com/...
-            import re
 
-            region_match = re.search(
-                r"bedrock-agentcore\.([^.]+)\.amazonaws\.com", ws_url
-            )
-            region = region_match.group(1) if region_match else "us-west-2"
+# wss://bedrock-agentcore.ap-northeast-1.amazonaws.com/...
+REGION_PATTERN = re.compile(r"bedrock-agentcore\.([^.]+)\.amazonaws\.com")
+DEFAULT_REGION = "us-west-2"
 
-            # Initialize AWS client
-            client = AgentCoreRuntimeClient(region=region)
+# AgentCore accepts a SigV4 signature for 5 minutes after its X-Amz-Date
+SIGNATURE_TTL = 300.0
 
-            # Generate authenticated WebSocket connection
-            auth_url, headers = client.generate_ws_connection(
-                runtime_arn=runtime_arn, session_id=agent_session_id
-            )
 
-            # Use authenticated URL and headers
-            async with websockets.connect(
-                auth_url, additional_headers=headers
-            ) as websocket:
-                await _handle_websocket(websocket, prompt, session_id)
+def is_aws_url(ws_url: str) -> bool:
+    return ws_url.startswith("wss://bedrock-agentcore")
 
-        elif is_aws:
-            print("❌ AWS connection requires bedrock-agentcore package")
-            print("   Install: uv add bedrock-agentcore")
-            return
 
-        else:
+class ConnectionManager:
+    """
+    Opens agent connections without repeating the setup work.
+
+    - AgentCoreRuntimeClient instances (boto3 session and credential
+      lookup) are created once per region
+    - Signed URLs and headers are reused per runtime and agent session until
+      refresh_margin seconds before the signature expires
+    - lease() hands out one shared open connection per URL, agent session
+      and Claude session, reopened once it closed; concurrent prompts to
+      the same conversation wait for the turn before them to finish. The
+      agent's CLI holds one conversation per connection, so prompts for
+      another Claude session never share it
+    """
+
+    def __init__(self, refresh_margin: float = 60.0):
+        self.refresh_margin = refresh_margin
+        self._clients: dict[str, AgentCoreRuntimeClient] = {}
+        # (runtime_arn, agent_session_id) -> (url, headers, expires_at)
+        self._signed: dict[tuple[str, str], tuple[str, dict[str, str], float]] = {}
+        # (ws_url, agent_session_id, session_id) -> connection
+        self._connections: dict[tuple[str, str, str | None], ClientConnection] = {}
+        self._locks: dict[tuple[str, str, str | None], asyncio.Lock] = {}
+
+    def region(self, ws_url: str) -> str:
+        match = REGION_PATTERN.search(ws_url)
+        return match.group(1) if match else DEFAULT_REGION
+
+    def runtime_client(self, region: str) -> "AgentCoreRuntimeClient":
+        client = self._clients.get(region)
+        if client is None:
+            client = self._clients[region] = AgentCoreRuntimeClient(region=region)
+        return client
+
+    def signed(
+        self, ws_url: str, runtime_arn: str, agent_session_id: str
+    ) -> tuple[str, dict[str, str]]:
+        """Return the signed URL and headers, signing again near expiry."""
+        key = (runtime_arn, agent_session_id)
+        cached = self._signed.get(key)
+        now = time.monotonic()
+        if cached is not None and cached[2] - self.refresh_margin > now:
+            return cached[0], cached[1]
+        auth_url, headers = self.runtime_client(
+            self.region(ws_url)
+        ).generate_ws_connection(runtime_arn=runtime_arn, session_id=agent_session_id)
+        self._signed[key] = (auth_url, headers, now + SIGNATURE_TTL)
+        return auth_url, headers
+
+    async def open(
+        self, ws_url: str, agent_session_id: str, runtime_arn: str | None = None
+    ) -> ClientConnection:
+        """
+        Open a new WebSocket connection to the agent.
+
+        AWS URLs (wss://bedrock-agentcore...) are signed with SigV4 for
+        runtime_arn and agent_session_id; local URLs are used as is.
+        """
+        if not is_aws_url(ws_url):
             # Local development - no authentication needed
-            async with websockets.connect(ws_url) as websocket:
-                await _handle_websocket(websocket, prompt, session_id)
+            return await websockets.connect(ws_url)
+        if not runtime_arn or not HAS_AGENTCORE:
+            raise RuntimeError(
+                "AWS connection requires runtime_arn and the bedrock-agentcore "
+                "package (uv add bedrock-agentcore)"
+            )
+        auth_url, headers = self.signed(ws_url, runtime_arn, agent_session_id)
+        return await websockets.connect(auth_url, additional_headers=headers)
+
+    @contextlib.asynccontextmanager
+    async def lease(
+        self,
+        ws_url: str,
+        agent_session_id: str,
+        runtime_arn: str | None = None,
+        session_id: str | None = None,
+    ) -> AsyncIterator[ClientConnection]:
+        """
+        Use the shared connection for ws_url, agent_session_id and the
+        Claude session_id (None: a new conversation) for one turn.
+
+        The connection is held exclusively until the block exits, so frames
+        of concurrent prompts never interleave on the socket.
+        """
+        key = (ws_url, agent_session_id, session_id)
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            websocket = self._connections.get(key)
+            if websocket is None or websocket.state is not State.OPEN:
+                websocket = await self.open(ws_url, agent_session_id, runtime_arn)
+                self._connections[key] = websocket
+            yield websocket
+
+    async def discard(
+        self, ws_url: str, agent_session_id: str, session_id: str | None = None
+    ) -> None:
+        """Close the shared connection, e.g. after a turn did not complete."""
+        websocket = self._connections.pop((ws_url, agent_session_id, session_id), None)
+        if websocket is not None:
+            await websocket.close()
+
+    async def adopt(self, ws_url: str, agent_session_id: str, session_id: str) -> None:
+        """
+        Key the new-conversation connection by the session_id its first turn
+        created, so follow-up prompts of that conversation reuse it.
+        """
+        websocket = self._connections.pop((ws_url, agent_session_id, None), None)
+        if websocket is None:
+            return
+        key = (ws_url, agent_session_id, session_id)
+        if key in self._connections:
+            await websocket.close()
+        else:
+            self._connections[key] = websocket
+
+    async def close(self) -> None:
+        """Close all shared connections."""
+        connections, self._connections = self._connections, {}
+        await asyncio.gather(
+            *(websocket.close() for websocket in connections.values()),
+            return_exceptions=True,
+        )
 
-    except ConnectionRefusedError:
-        print("❌ Connection refused. Make sure the agent is running locally.")
-        print("   Run: uv run agentcore dev")
-    except Exception as e:
-        print(f"❌ Error: {e}")
 
+# Shared by all prompts sent from this process
+connections = ConnectionManager()
 
-async def _handle_websocket(websocket, prompt: str, session_id: str | None):
-    """Handle WebSocket communication"""
+
+@contextlib.asynccontextmanager
+async def connect(
+    ws_url: str, agent_session_id: str, runtime_arn: str | None = None
+) -> AsyncIterator[ClientConnection]:
+    """Open a dedicated connection (signing is cached by `connections`)."""
+    websocket = await connections.open(ws_url, agent_session_id, runtime_arn)
+    try:
+        yield websocket
+    finally:
+        await websocket.close()
+
+
+async def _handle_websocket(
+    websocket, prompt: str, session_id: str | None
+) -> dict | None:
+    """Handle WebSocket communication; return the turn_complete frame"""
     try:
         # Send message with optional session_id
         message = {"prompt": prompt}
@@ -101,9 +247,27 @@ async def _handle_websocket(websocket, prompt: str, session_id: str | None):
         await websocket.send(json.dumps(message))
 
         # Receive streaming responses
+        in_result_chunks = False
         async for message in websocket:
             data = json.loads(message)
 
+            # Large tool results arrive as a header followed by chunks
+            if "result_chunk" in data:
+                if data.get("encoding") != "base64":
+                    print(data["result_chunk"], end="", flush=True)
+                    in_result_chunks = True
+                continue
+            if in_result_chunks:
+                print()
+                in_result_chunks = False
+            if "result_image" in data:
+                image = data["result_image"]
+                print(f"🖼️  {image.get('media_type')} ({image.get('bytes')} bytes)")
+                continue
+            if "result_item" in data:
+                print(f"📎 {data['result_item'].get('type')}")
+                continue
+
             if "error" in data:
                 print(f"❌ Error: {data['error']}")
                 break
@@ -117,23 +281,34 @@ async def _handle_websocket(websocket, prompt: str, session_id: str | None):
                 print(f"   Input: {json.dumps(tool_input, indent=2)}")
 
                 # Ask user for approval (non-blocking async input)
+                # y/n = this call only
+                # a = approve this tool for the rest of the session
+                # N = always deny this tool for the rest of the session
                 loop = asyncio.get_event_loop()
                 approved = False
+                scope = "once"
 
                 while True:
                     # Run input() in thread pool to avoid blocking the event loop
                     response = await loop.run_in_executor(
-                        None, lambda: input("   Approve? (y/n): ").strip().lower()
+                        None, lambda: input("   Approve? (y/n/a/N): ").strip()
                     )
-                    if response in ["y", "n"]:
-                        approved = response == "y"
+                    if response in ["y", "n", "a", "N"]:
+                        approved = response in ["y", "a"]
+                        if response in ["a", "N"]:
+                            scope = "tool"
                         break
-                    print("   Please enter 'y' or 'n'")
+                    print("   Please enter 'y', 'n', 'a' or 'N'")
 
                 # Send approval response back to agent
                 await websocket.send(
                     json.dumps(
-                        {"type": "tool_permission_response", "approved": approved}
+                        {
+                            "type": "tool_permission_response",
+                            "request_id": data.get("request_id"),
+                            "approved": approved,
+                            "scope": scope,
+                        }
                     )
                 )
 
@@ -144,6 +319,12 @@ async def _handle_websocket(websocket, prompt: str, session_id: str | None):
 
                 continue
 
+            # The agent keeps the connection open; stop after this prompt's turn
+            if data.get("type") == "turn_complete":
+                if data.get("session_id"):
+                    print(f"🔄 Claude Session ID: {data['session_id']}")
+                return data
+
             # Handle event-based streaming messages
             if "event" in data:
                 event_data = data["event"]
@@ -172,6 +353,20 @@ async def _handle_websocket(websocket, prompt: str, session_id: str | None):
 
     except Exception as e:
         print(f"❌ WebSocket error: {e}")
+    return None
+
+
+async def main(
+    ws_url: str,
+    prompt: str,
+    session_id: str | None,
+    agent_session_id: str | None,
+    runtime_arn: str | None,
+) -> None:
+    try:
+        await send_message(ws_url, prompt, session_id, agent_session_id, runtime_arn)
+    finally:
+        await connections.close()
 
 
 if __name__ == "__main__":
@@ -195,4 +390,4 @@ if __name__ == "__main__":
     )
     runtime_arn = sys.argv[5] if len(sys.argv) > 5 else None
 
-    asyncio.run(send_message(ws_url, prompt, session_id, agent_session_id, runtime_arn))
+    asyncio.run(main(ws_url, prompt, session_id, agent_session_id, runtime_arn))
@@ -0,0 +1,162 @@
+"""
+Offline benchmark of the streaming path using recorded message streams.
+
+Recorded turns (*.jsonl.gz from RECORD_MESSAGES_DIR; log/development.jsonl.gz
+is a sample turn) are replayed through a stub client into stream_turn, the
+dispatch loop shared by invoke and the WebSocket handler.
+
+Usage:
+    uv run python -m scripts.bench_replay [paths...] [--iterations N] [--speed S]
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+from claude_agent_sdk.types import StreamEvent
+
+from src.main import stream_turn
+from src.message import TurnContext, get_router
+from src.metrics import TurnMetrics
+from src.pool import Lease
+from src.replay import Recording, ReplayClient, load_recordings
+
+DEFAULT_PATHS = [Path("log/development.jsonl.gz")]
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def replay_turn(recording: Recording, speed: float) -> int:
+    """Replay one turn through stream_turn; return the number of responses."""
+    client = ReplayClient(recording, speed=speed)
+    lease = Lease(client=client)  # type: ignore[arg-type]
+    turn = TurnMetrics("replay")
+    turn.query_sent()
+    await client.query("replay")
+    responses = 0
+    async for _ in stream_turn(client, lease, turn):  # type: ignore[arg-type]
+        responses += 1
+    return responses
+
+
+async def bench_pipeline(
+    recordings: list[Recording], iterations: int, speed: float
+) -> None:
+    messages = sum(len(r) for r in recordings) * iterations
+    turn_seconds: list[float] = []
+    responses = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for recording in recordings:
+            turn_started = time.perf_counter()
+            responses += await replay_turn(recording, speed)
+            turn_seconds.append(time.perf_counter() - turn_started)
+    elapsed = time.perf_counter() - started
+
+    print("== stream_turn pipeline")
+    print(f"turns:        {len(turn_seconds)}")
+    print(f"messages:     {messages} -> {responses} responses")
+    print(f"events/sec:   {messages / elapsed:,.0f}")
+    print(
+        f"turn ms:      p50={percentile(turn_seconds, 0.5) * 1000:.3f} "
+        f"p95={percentile(turn_seconds, 0.95) * 1000:.3f} "
+        f"max={max(turn_seconds) * 1000:.3f}"
+    )
+
+
+def handler_name(msg: object) -> str:
+    """Name a routing entry: message type, or stream event/delta type."""
+    if isinstance(msg, StreamEvent):
+        event = msg.event
+        if event["type"] == "content_block_delta":
+            return f"StreamEvent[{event['delta']['type']}]"
+        return f"StreamEvent[{event['type']}]"
+    return type(msg).__name__
+
+
+def bench_handlers(recordings: list[Recording], iterations: int) -> None:
+    router = get_router("sse")
+    samples: dict[str, list[int]] = {}
+    for _ in range(iterations):
+        for recording in recordings:
+            context = TurnContext()
+            for _, msg in recording:
+                started = time.perf_counter_ns()
+                response = router.dispatch(msg, context)
+                if response is not None and type(response) is not dict:
+                    # Handlers may yield frames lazily
+                    for _ in response:
+                        pass
+                elapsed = time.perf_counter_ns() - started
+                samples.setdefault(handler_name(msg), []).append(elapsed)
+
+    print("== per-handler latency (us, MessageRouter.dispatch)")
+    for name, values in sorted(samples.items()):
+        print(
+            f"{name:<36} n={len(values):<7} "
+            f"mean={statistics.fmean(values) / 1000:.2f} "
+            f"p50={percentile(values, 0.5) / 1000:.2f} "
+            f"p99={percentile(values, 0.99) / 1000:.2f}"
+        )
+
+
+async def bench_allocations(
+    recordings: list[Recording], speed: float, top: int
+) -> None:
+    # Warm up caches and lazy imports outside the traced run
+    await replay_turn(recordings[0], speed)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for recording in recordings:
+        await replay_turn(recording, speed)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "lineno")
+    messages = sum(len(r) for r in recordings)
+    print("== allocations (one pass)")
+    print(f"peak:         {peak / 1024:,.1f} KiB ({peak / messages:,.0f} B/message)")
+    print(f"retained:     {sum(s.size_diff for s in stats) / 1024:,.1f} KiB")
+    for stat in stats[:top]:
+        print(f"  {stat}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="*", type=Path, default=DEFAULT_PATHS)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0.0,
+        help="replay speed factor (1.0 = recorded timing, 0 = full speed)",
+    )
+    parser.add_argument("--top", type=int, default=5, help="allocation sites shown")
+    args = parser.parse_args()
+
+    # Per-message logging would dominate the measurement
+    logging.getLogger("bedrock_agentcore.app").setLevel(logging.WARNING)
+
+    recordings = [r for r in load_recordings(args.paths) if r]
+    if not recordings:
+        parser.error("no recorded messages found")
+    print(
+        f"Loaded {len(recordings)} turn(s), {sum(len(r) for r in recordings)} messages"
+    )
+
+    asyncio.run(bench_pipeline(recordings, args.iterations, args.speed))
+    bench_handlers(recordings, args.iterations)
+    asyncio.run(bench_allocations(recordings, args.speed, args.top))
+
+
+if __name__ == "__main__":
+    main()
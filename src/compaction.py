@@ -0,0 +1,214 @@
+"""Compaction of large session jsonl files before resume."""
+
+import dataclasses
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from src.metrics import registry as metrics
+
+# Ends every compacted text, so compacted results are not cut again
+MARKER = "removed by session compaction]"
+
+metrics.counter("agent_session_compactions_total", "Session jsonl files compacted")
+metrics.counter(
+    "agent_session_compaction_saved_bytes_total", "Bytes removed by compaction"
+)
+metrics.histogram("agent_session_compact_seconds", "Time to compact a session jsonl")
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class CompactionPolicy:
+    """
+    When and how much of a session history is compacted.
+
+    Sessions larger than max_bytes (0 = never) are compacted: text of all
+    but the keep_recent most recent tool results is cut to max_result_chars
+    and their images are dropped. A file found incompressible is checked
+    again once it grew by recheck_bytes.
+    """
+
+    max_bytes: int = 2 * 1024 * 1024
+    keep_recent: int = 8
+    max_result_chars: int = 1000
+    recheck_bytes: int = 256 * 1024
+
+
+@dataclasses.dataclass(slots=True)
+class CompactionResult:
+    bytes_before: int
+    bytes_after: int
+    tool_results: int
+    seconds: float
+
+    @property
+    def saved(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+def _compact_tool_result(block: dict[str, Any], tool_name: str, limit: int) -> bool:
+    """Cut the content of a tool_result block in place; return if it changed."""
+    content = block.get("content")
+    if isinstance(content, str):
+        items = [{"type": "text", "text": content}]
+    elif isinstance(content, list):
+        items = content
+    else:
+        return False
+
+    changed = False
+    compacted = []
+    for item in items:
+        item_type = item.get("type") if isinstance(item, dict) else None
+        text = item.get("text", "") if item_type == "text" else ""
+        if item_type == "text" and len(text) > limit and not text.endswith(MARKER):
+            removed = len(text) - limit
+            item = {
+                **item,
+                "text": f"{text[:limit]}\n[... {removed:,} chars of {tool_name} "
+                f"output {MARKER}",
+            }
+            changed = True
+        elif item_type == "image":
+            item = {
+                "type": "text",
+                "text": f"[image from {tool_name} {MARKER}",
+            }
+            changed = True
+        compacted.append(item)
+
+    if changed:
+        block["content"] = (
+            compacted[0]["text"] if isinstance(content, str) else compacted
+        )
+    return changed
+
+
+def compact_jsonl(data: bytes, policy: CompactionPolicy) -> tuple[bytes, int]:
+    """
+    Compact old tool results in session jsonl bytes.
+
+    Returns the new bytes and the number of tool results compacted. Lines
+    without compacted results are kept byte for byte; compacted lines also
+    lose their toolUseResult copy of the output.
+    """
+    lines = data.split(b"\n")
+    tool_names: dict[str, str] = {}
+    entries: dict[int, dict[str, Any]] = {}
+    results: list[tuple[int, dict[str, Any]]] = []
+
+    for index, line in enumerate(lines):
+        if b'"tool_use"' not in line and b'"tool_result"' not in line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        content = (entry.get("message") or {}).get("content")
+        if not isinstance(content, list):
+            continue
+        for block in content:
+            if not isinstance(block, dict):
+                continue
+            if block.get("type") == "tool_use":
+                tool_names[block.get("id", "")] = block.get("name", "tool")
+            elif block.get("type") == "tool_result":
+                entries[index] = entry
+                results.append((index, block))
+
+    old = results[: -policy.keep_recent] if policy.keep_recent else results
+    changed: set[int] = set()
+    count = 0
+    for index, block in old:
+        tool_name = tool_names.get(block.get("tool_use_id", ""), "tool")
+        if _compact_tool_result(block, tool_name, policy.max_result_chars):
+            count += 1
+            changed.add(index)
+            entries[index].pop("toolUseResult", None)
+
+    for index in changed:
+        lines[index] = json.dumps(
+            entries[index], ensure_ascii=False, separators=(",", ":")
+        ).encode()
+    return b"\n".join(lines), count
+
+
+def compact_session_file(
+    path: Path, policy: CompactionPolicy
+) -> CompactionResult | None:
+    """
+    Compact path in place if it exceeds policy.max_bytes.
+
+    The file is rewritten through a temp file and rename. Returns None when
+    nothing was compacted.
+    """
+    if not policy.max_bytes:
+        return None
+    try:
+        size = path.stat().st_size
+    except FileNotFoundError:
+        return None
+    if size <= policy.max_bytes:
+        return None
+
+    started = time.perf_counter()
+    compacted, count = compact_jsonl(path.read_bytes(), policy)
+    if not count or len(compacted) >= size:
+        return None
+    tmp_path = path.with_name(f".{path.name}.compact.tmp")
+    tmp_path.write_bytes(compacted)
+    os.replace(tmp_path, path)
+
+    result = CompactionResult(
+        size, len(compacted), count, time.perf_counter() - started
+    )
+    metrics.inc("agent_session_compactions_total")
+    metrics.inc("agent_session_compaction_saved_bytes_total", result.saved)
+    return result
+
+
+class SessionCompactor:
+    """
+    compact_session_file that remembers incompressible files.
+
+    A session over max_bytes whose history is mostly conversation has
+    nothing left to cut; without this, every resumed turn would read and
+    parse the whole file again. Such files are skipped until they grew by
+    policy.recheck_bytes past the size last found incompressible.
+    """
+
+    def __init__(self, policy: CompactionPolicy, max_entries: int = 1024):
+        self.policy = policy
+        self.max_entries = max_entries
+        # path -> size at which nothing could be compacted
+        self._incompressible: OrderedDict[Path, int] = OrderedDict()
+
+    def compact(self, path: Path) -> CompactionResult | None:
+        """Compact path unless it is known to be incompressible at its size."""
+        known = self._incompressible.get(path)
+        if known is not None:
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                return None
+            # A file that shrank was replaced (e.g. restored), check it again
+            if known <= size < known + self.policy.recheck_bytes:
+                return None
+
+        result = compact_session_file(path, self.policy)
+        if result is not None:
+            self._incompressible.pop(path, None)
+            return result
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return None
+        if self.policy.max_bytes and size > self.policy.max_bytes:
+            self._incompressible[path] = size
+            self._incompressible.move_to_end(path)
+            while len(self._incompressible) > self.max_entries:
+                self._incompressible.popitem(last=False)
+        return None
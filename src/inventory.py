@@ -0,0 +1,91 @@
+"""Incremental inventory of the Claude projects directory."""
+
+import os
+from pathlib import Path
+
+from src.metrics import registry as metrics
+from src.session_store import PROJECTS_DIR
+
+metrics.gauge("agent_projects_files", "Files in the Claude projects directory")
+metrics.gauge("agent_projects_dirs", "Directories in the Claude projects directory")
+metrics.gauge("agent_projects_bytes", "Total bytes of Claude projects files")
+
+
+class ProjectsInventory:
+    """
+    Cached listing of ~/.claude/projects/-var-task/.
+
+    refresh() only rescans when the directory mtime changed (a file was added,
+    removed or renamed). Sizes of session files that grow in place are
+    updated with touch(), which is a single stat. Counts and total bytes are
+    published as gauges.
+    """
+
+    def __init__(self, projects_dir: Path = PROJECTS_DIR):
+        self.projects_dir = projects_dir
+        self._mtime_ns: int | None = None
+        # None until the first refresh()
+        self._exists: bool | None = None
+        # name -> (is_dir, size in bytes)
+        self._entries: dict[str, tuple[bool, int]] = {}
+
+    def refresh(self) -> bool:
+        """Update the listing; return True if anything changed."""
+        try:
+            stat = self.projects_dir.stat()
+        except FileNotFoundError:
+            changed = self._exists is not False
+            self._exists = False
+            self._mtime_ns = None
+            self._entries.clear()
+            self._publish()
+            return changed
+
+        if self._exists and stat.st_mtime_ns == self._mtime_ns:
+            return False
+
+        entries: dict[str, tuple[bool, int]] = {}
+        with os.scandir(self.projects_dir) as it:
+            for entry in it:
+                if entry.is_dir():
+                    entries[entry.name] = (True, 0)
+                else:
+                    entries[entry.name] = (False, entry.stat().st_size)
+        # Only after a successful scan, so a failed one is retried
+        self._exists = True
+        self._mtime_ns = stat.st_mtime_ns
+        self._entries = entries
+        self._publish()
+        return True
+
+    def touch(self, session_id: str) -> int:
+        """Re-stat a single session file; return its size (0 if missing)."""
+        name = f"{session_id}.jsonl"
+        try:
+            size = (self.projects_dir / name).stat().st_size
+        except FileNotFoundError:
+            self._entries.pop(name, None)
+            size = 0
+        else:
+            self._entries[name] = (False, size)
+        self._publish()
+        return size
+
+    @property
+    def exists(self) -> bool:
+        return bool(self._exists)
+
+    def metrics(self) -> dict[str, int]:
+        """Return file/directory counts and total bytes of files."""
+        dirs = sum(1 for is_dir, _ in self._entries.values() if is_dir)
+        return {
+            "files": len(self._entries) - dirs,
+            "dirs": dirs,
+            "total_bytes": sum(size for _, size in self._entries.values()),
+        }
+
+    def _publish(self) -> None:
+        values = self.metrics()
+        metrics.set("agent_projects_files", values["files"])
+        metrics.set("agent_projects_dirs", values["dirs"])
+        metrics.set("agent_projects_bytes", values["total_bytes"])
@@ -0,0 +1,108 @@
+"""Logging helpers for the invoke hot path."""
+
+import dataclasses
+import logging
+import reprlib
+import time
+from typing import Any
+
+from claude_agent_sdk.types import StreamEvent
+
+
+class _PayloadRepr(reprlib.Repr):
+    """reprlib.Repr that also bounds dataclasses (SDK messages and blocks)."""
+
+    def repr_instance(self, obj: Any, level: int) -> str:
+        if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+            name = type(obj).__name__
+            if level <= 0:
+                return f"{name}(...)"
+            fields = ", ".join(
+                f"{f.name}={self.repr1(getattr(obj, f.name), level - 1)}"
+                for f in dataclasses.fields(obj)
+            )
+            return f"{name}({fields})"
+        return super().repr_instance(obj, level)
+
+
+def parse_level(value: str) -> int | None:
+    """
+    Return the numeric logging level for a name such as "info" or "DEBUG".
+
+    Unknown names give None; numeric strings are accepted as is.
+    """
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    return logging.getLevelNamesMapping().get(value.upper())
+
+
+def truncate_payload(obj: Any, max_chars: int = 500) -> str:
+    """
+    Return a bounded repr of obj.
+
+    Nested containers, long strings and dataclasses are shortened while
+    formatting, so a large payload is never fully rendered.
+    """
+    text = _PayloadRepr(maxlevel=4, maxstring=120, maxother=120).repr(obj)
+    if len(text) > max_chars:
+        return f"{text[:max_chars]}... ({len(text)} chars)"
+    return text
+
+
+class MessageLogger:
+    """
+    Structured, level-gated logging of Claude Agent SDK messages.
+
+    - Nothing is formatted when the configured level is disabled
+    - Payloads are truncated to max_chars
+    - StreamEvents (one per token) are rate-limited to one record per
+      stream_interval seconds; the record carries the number suppressed
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        level: int = logging.DEBUG,
+        max_chars: int = 500,
+        stream_interval: float = 1.0,
+    ):
+        self.logger = logger
+        self.level = level
+        self.max_chars = max_chars
+        self.stream_interval = stream_interval
+        self._next_stream_log = 0.0
+        self._suppressed = 0
+
+    def message(self, msg: Any) -> None:
+        """Log a single SDK message."""
+        if not self.logger.isEnabledFor(self.level):
+            return
+
+        if isinstance(msg, StreamEvent):
+            now = time.monotonic()
+            if now < self._next_stream_log:
+                self._suppressed += 1
+                return
+            self._next_stream_log = now + self.stream_interval
+            suppressed, self._suppressed = self._suppressed, 0
+            self.logger.log(
+                self.level,
+                "message=StreamEvent type=%s suppressed=%d payload=%s",
+                msg.event.get("type"),
+                suppressed,
+                truncate_payload(msg.event, self.max_chars),
+            )
+            return
+
+        self.logger.log(
+            self.level,
+            "message=%s payload=%s",
+            type(msg).__name__,
+            truncate_payload(msg, self.max_chars),
+        )
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return a child of the AgentCore app logger so records share its handler."""
+    return logging.getLogger(f"bedrock_agentcore.app.{name}")
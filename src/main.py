@@ -1,63 +1,517 @@
+import time
+
+from src.startup import StartupTimer
+
+# Started before the imports below: claude_agent_sdk and bedrock_agentcore
+# dominate startup (broken down by `python -m src.startup`)
+startup = StartupTimer()
+
+import asyncio
+import collections
+import contextlib
+import json
+import logging
 import os
+from collections.abc import AsyncIterator
 from pathlib import Path
 from typing import Any
 
 from bedrock_agentcore.runtime import BedrockAgentCoreApp
-from claude_agent_sdk import (
-    AssistantMessage,
-    ClaudeAgentOptions,
-    ClaudeSDKClient,
-    ResultMessage,
-    SystemMessage,
-    UserMessage,
-)
-from claude_agent_sdk.types import StreamEvent
+from claude_agent_sdk import ClaudeSDKClient
 from dotenv import load_dotenv
-
-from src.message import (
-    handle_assistant_message,
-    handle_result_message,
-    handle_stream_event,
-    handle_system_message,
-    handle_user_message,
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+from starlette.websockets import WebSocketDisconnect
+
+from src.compaction import CompactionPolicy, SessionCompactor
+from src.inventory import ProjectsInventory
+from src.log_utils import MessageLogger, parse_level, truncate_payload
+from src.message import ToolResultPolicy, TurnContext, get_router
+from src.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from src.metrics import TurnMetrics
+from src.metrics import registry as metrics_registry
+from src.options import build_options
+from src.permissions import PermissionBroker, PermissionPolicyCache
+from src.pool import ClientPool, Lease
+from src.response_cache import ResponseCache
+from src.session_store import (
+    PROJECTS_DIR,
+    ChunkedSessionBackend,
+    LocalBlobStore,
+    LocalDirectoryBackend,
+    SessionPersister,
 )
-from src.tools import tools_server
+from src.stream import coalesce_text_deltas
+from src.tool_calls import ToolCallTracker
+from src.tool_executor import get_executor
+
+startup.mark("imports")
 
 # Load environment variables
 load_dotenv()
+startup.mark("dotenv")
+
 
-app = BedrockAgentCoreApp()
+@contextlib.asynccontextmanager
+async def lifespan(app: BedrockAgentCoreApp) -> AsyncIterator[None]:
+    """Start the warm-up with the server; close pooled clients on shutdown."""
+    global warm_up_task
+    if WARM_UP:
+        warm_up_task = asyncio.create_task(warm_up())
+    try:
+        yield
+    finally:
+        if warm_up_task:
+            warm_up_task.cancel()
+        await client_pool.close()
+        get_executor().shutdown()
+
+
+app = BedrockAgentCoreApp(lifespan=lifespan)
 log = app.logger
+startup.mark("app")
 
 # Verify Anthropic API key is set
 if not os.getenv("ANTHROPIC_API_KEY"):
     log.warning("ANTHROPIC_API_KEY is not set. Please set it in .env file.")
 
+# Text delta coalescing for SSE streaming (0 disables)
+STREAM_COALESCE_MAX_BYTES = int(os.getenv("STREAM_COALESCE_MAX_BYTES", "512"))
+STREAM_COALESCE_MAX_DELAY_MS = int(os.getenv("STREAM_COALESCE_MAX_DELAY_MS", "30"))
+
+# Per-message logging in the invoke loop (level-gated, truncated, rate-limited)
+LOG_MESSAGE_LEVEL = parse_level(os.getenv("LOG_MESSAGE_LEVEL", "DEBUG"))
+if LOG_MESSAGE_LEVEL is None:
+    log.warning(
+        f"Unknown LOG_MESSAGE_LEVEL {os.getenv('LOG_MESSAGE_LEVEL')!r}, using DEBUG"
+    )
+    LOG_MESSAGE_LEVEL = logging.DEBUG
+LOG_MAX_PAYLOAD_CHARS = int(os.getenv("LOG_MAX_PAYLOAD_CHARS", "500"))
+LOG_STREAM_EVENT_INTERVAL_MS = int(os.getenv("LOG_STREAM_EVENT_INTERVAL_MS", "1000"))
+
+# Tool result forwarding: truncation (0 = unlimited) and frame size in chars
+TOOL_RESULT_POLICY = ToolResultPolicy(
+    max_chars=int(os.getenv("TOOL_RESULT_MAX_CHARS", "65536")),
+    chunk_chars=int(os.getenv("TOOL_RESULT_CHUNK_CHARS", "8192")),
+    forward_images=os.getenv("TOOL_RESULT_FORWARD_IMAGES", "0") == "1",
+)
+
+# Compaction of old tool results in session histories larger than
+# SESSION_COMPACT_MAX_BYTES before resume (0 disables)
+SESSION_COMPACTION = CompactionPolicy(
+    max_bytes=int(os.getenv("SESSION_COMPACT_MAX_BYTES", str(2 * 1024 * 1024))),
+    keep_recent=int(os.getenv("SESSION_COMPACT_KEEP_RECENT", "8")),
+    max_result_chars=int(os.getenv("SESSION_COMPACT_RESULT_CHARS", "1000")),
+)
+session_compactor = SessionCompactor(SESSION_COMPACTION)
+
+# Claude sessions held in memory by the CLI of an open WebSocket connection
+websocket_sessions: collections.Counter[str] = collections.Counter()
+
+# Response cache for prompts without session_id whose turn used no tools
+# (RESPONSE_CACHE_SIZE=0 disables; RESPONSE_CACHE_DIR adds a disk tier)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "0"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR")
+
+# Directory to record receive_response() streams to for offline replay (optional)
+RECORD_MESSAGES_DIR = os.getenv("RECORD_MESSAGES_DIR")
+
+# Maximum concurrent prompts for batch invocations
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# WebSocket connections: outbound frame buffer and tool approval timeout
+WS_OUTBOUND_QUEUE_SIZE = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", "256"))
+WS_PERMISSION_TIMEOUT = float(os.getenv("WS_PERMISSION_TIMEOUT", "30"))
+
+# Remembered tool permission decisions per WebSocket connection
+PERMISSION_CACHE_SIZE = int(os.getenv("PERMISSION_CACHE_SIZE", "256"))
+PERMISSION_CACHE_TTL = float(os.getenv("PERMISSION_CACHE_TTL", "900"))
+
+# Pre-warmed ClaudeSDKClient pool (CLIENT_POOL_SIZE=0 disables pooling)
+client_pool = ClientPool(
+    size=int(os.getenv("CLIENT_POOL_SIZE", "4")),
+    idle_ttl=float(os.getenv("CLIENT_POOL_IDLE_TTL", "600")),
+    max_uses=int(os.getenv("CLIENT_POOL_MAX_USES", "20")),
+    warm=int(os.getenv("CLIENT_POOL_WARM", "1")),
+)
+
+# Warm-up when the server starts: pre-warm the client pool (CLI spawn, init
+# handshake, MCP server) and tool process workers (WARM_UP=0 disables)
+WARM_UP = os.getenv("WARM_UP", "1") == "1"
+WARM_UP_TOOL_WORKERS = int(os.getenv("WARM_UP_TOOL_WORKERS", "1"))
+warm_up_task: asyncio.Task | None = None
+startup.mark("config")
+
+
+def create_session_persister() -> SessionPersister | None:
+    """
+    Create the session persister from env (enabled when SESSION_STORE_DIR is set).
+
+    SESSION_STORE_FORMAT selects plain `jsonl` files or `chunked` compressed
+    chunks; with chunked, SESSION_RESTORE_TAIL restores only the history
+    needed for resume.
+    """
+    store_dir = os.getenv("SESSION_STORE_DIR")
+    if not store_dir:
+        return None
+
+    if os.getenv("SESSION_STORE_FORMAT", "jsonl") == "chunked":
+        backend = ChunkedSessionBackend(
+            LocalBlobStore(Path(store_dir)),
+            chunk_size=int(os.getenv("SESSION_CHUNK_SIZE", str(1024 * 1024))),
+        )
+        tail_restore = os.getenv("SESSION_RESTORE_TAIL", "1") == "1"
+        return SessionPersister(backend, tail_restore=tail_restore)
+
+    return SessionPersister(LocalDirectoryBackend(Path(store_dir)))
+
+
+session_persister = create_session_persister()
+response_cache = (
+    ResponseCache(
+        max_entries=RESPONSE_CACHE_SIZE,
+        ttl=RESPONSE_CACHE_TTL,
+        directory=Path(RESPONSE_CACHE_DIR) if RESPONSE_CACHE_DIR else None,
+    )
+    if RESPONSE_CACHE_SIZE
+    else None
+)
+
+# Incrementally tracked listing of the Claude projects directory
+projects_inventory = ProjectsInventory()
+startup.mark("session_store")
+
+
+async def warm_up() -> None:
+    """
+    Move cold-start costs out of the first request.
+
+    Builds the base options (importing the tools), starts the warm pooled
+    clients and tool workers. /ping reports HealthyBusy until it finished.
+    Failures are logged; requests then start their clients themselves.
+    """
+    task_id = app.add_async_task("warm_up")
+    started = time.perf_counter()
+    try:
+        options = build_options()
+        await asyncio.gather(
+            client_pool.prewarm(options),
+            get_executor().warm(WARM_UP_TOOL_WORKERS),
+        )
+        log.info(
+            f"Warm-up complete in {(time.perf_counter() - started) * 1000:.0f}ms "
+            f"(pool={client_pool.stats()})"
+        )
+    except Exception as e:
+        log.warning(f"Warm-up failed: {e}")
+    finally:
+        app.complete_async_task(task_id)
+
+
+async def wait_for_warm_up() -> None:
+    """Wait for a running warm-up instead of starting a client of our own."""
+    if warm_up_task is None or warm_up_task.done():
+        return
+    log.info("Waiting for warm-up to complete")
+    await asyncio.shield(warm_up_task)
+
 
 def log_claude_projects_files() -> None:
     """
-    Log the list of files in ~/.claude/projects/-var-task/ directory.
+    Log a summary of ~/.claude/projects/-var-task/ when it changed.
+
+    The directory is tracked incrementally by projects_inventory, so an
+    unchanged directory costs a single stat.
     """
-    projects_dir = Path.home() / ".claude" / "projects" / "-var-task"
+    try:
+        if not projects_inventory.refresh():
+            return
+    except Exception as e:
+        log.error(f"Error reading Claude projects directory: {e}")
+        return
 
-    if not projects_dir.exists():
+    projects_dir = projects_inventory.projects_dir
+    if not projects_inventory.exists:
         log.warning(f"Claude projects directory does not exist: {projects_dir}")
         return
 
-    if not projects_dir.is_dir():
-        log.warning(f"Claude projects path is not a directory: {projects_dir}")
+    metrics = projects_inventory.metrics()
+    log.info(
+        f"Claude projects directory: {projects_dir} "
+        f"(files={metrics['files']}, dirs={metrics['dirs']}, "
+        f"total_bytes={metrics['total_bytes']})"
+    )
+
+
+async def stream_turn(
+    client: ClaudeSDKClient,
+    lease: Lease,
+    turn: TurnMetrics | None = None,
+    transport: str = "sse",
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Stream the responses of one turn from client.
+
+    This is the dispatch loop shared by all transports; messages are routed
+    through the transport's MessageRouter. The Claude session ID is recorded
+    on lease and lease.completed is set once the ResultMessage arrived.
+    Timings are recorded on turn if given.
+    """
+    router = get_router(transport)
+    tools = ToolCallTracker(on_complete=turn.tool_completed if turn else None)
+    context = TurnContext(tools=tools, tool_results=TOOL_RESULT_POLICY)
+    msg_log = MessageLogger(
+        log,
+        level=LOG_MESSAGE_LEVEL,
+        max_chars=LOG_MAX_PAYLOAD_CHARS,
+        stream_interval=LOG_STREAM_EVENT_INTERVAL_MS / 1000,
+    )
+
+    messages = client.receive_response()
+    if RECORD_MESSAGES_DIR:
+        # Only needed when recording, so not imported at startup
+        from src.replay import MessageRecorder
+
+        messages = MessageRecorder(Path(RECORD_MESSAGES_DIR)).watch(messages)
+    if turn:
+        messages = turn.watch(messages)
+
+    # Stream response events (text deltas are coalesced into chunks)
+    messages = coalesce_text_deltas(
+        messages,
+        max_bytes=STREAM_COALESCE_MAX_BYTES,
+        max_delay=STREAM_COALESCE_MAX_DELAY_MS / 1000,
+    )
+    try:
+        async for msg in messages:
+            msg_log.message(msg)
+            response = router.dispatch(msg, context)
+            if response is None:
+                continue
+            if type(response) is dict:
+                yield response
+            else:
+                for item in response:  # type: ignore[union-attr]
+                    yield item
+    finally:
+        # Also runs when the consumer stops early after the ResultMessage
+        lease.tool_calls = tools.started
+        if context.result is not None:
+            lease.session_id = context.result.session_id
+            lease.completed = True
+
+
+async def compact_session(session_id: str, turn: TurnMetrics | None = None) -> None:
+    """
+    Compact the session jsonl before resume if it exceeds the budget.
+
+    Old tool results are cut so the resumed history, and the tokens each
+    turn replays, stay bounded. The persister uploads the rewritten file
+    whole on the next save.
+
+    Skipped while a live CLI holds the session (a parked pooled client or a
+    WebSocket connection): it replays its in-memory history rather than the
+    file, and may be appending to the file. Compaction applies once that
+    client was retired.
+    """
+    if client_pool.holds(session_id) or websocket_sessions[session_id]:
+        return
+    path = PROJECTS_DIR / f"{session_id}.jsonl"
+    try:
+        result = await asyncio.to_thread(session_compactor.compact, path)
+    except Exception as e:
+        log.error(f"Failed to compact session {session_id}: {e}")
+        return
+    if result is None:
+        return
+    if session_persister:
+        session_persister.mark_rewritten(session_id)
+    if turn:
+        turn.record("session_compact", result.seconds)
+    log.info(
+        f"Session compacted: {session_id} ({result.bytes_before} -> "
+        f"{result.bytes_after} bytes, saved {result.saved}, "
+        f"{result.tool_results} tool results)"
+    )
+
+
+def hold_session(held: str | None, session_id: str | None) -> str | None:
+    """Move a WebSocket connection's entry in websocket_sessions; return it."""
+    if held == session_id:
+        return held
+    if held:
+        websocket_sessions[held] -= 1
+        if not websocket_sessions[held]:
+            del websocket_sessions[held]
+    if session_id:
+        websocket_sessions[session_id] += 1
+    return session_id
+
+
+async def save_session(session_id: str | None) -> None:
+    """Persist what the last turn appended to the session jsonl."""
+    if not session_id:
         return
+    try:
+        # The jsonl grew in place, which does not change the directory mtime
+        projects_inventory.touch(session_id)
+        if session_persister:
+            await session_persister.save(session_id)
+    except Exception as e:
+        log.error(f"Failed to save session {session_id}: {e}")
+
+
+def log_turn_timings(timings: dict[str, float]) -> None:
+    """Log the phase timings of a finished turn in milliseconds."""
+    summary = " ".join(
+        f"{name}={value:g}"
+        if name == "output_tokens"
+        else f"{name}_ms={value * 1000:.0f}"
+        for name, value in timings.items()
+    )
+    log.info(f"Turn timings: {summary}")
+
+
+async def run_prompt(
+    prompt: str,
+    session_id: str | None = None,
+    model: str | None = None,
+    max_turns: int | None = None,
+    transport: str = "sse",
+    use_cache: bool = True,
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Run a single prompt on a pooled client and yield response dicts.
+
+    Prompts without session_id are answered from response_cache when
+    enabled (unless use_cache is False): a hit replays the recorded
+    responses and ends with a turn_complete without session_id and with
+    "cached": True. Only completed turns without tool calls or errors are
+    recorded, since tool results may change between runs.
+
+    Errors are yielded as {"error": ...} instead of raised.
+    """
+    if session_id:
+        log.info(f"Resuming session: {session_id}")
+    else:
+        log.info("Starting new session")
 
+    turn = TurnMetrics(transport)
     try:
-        files = list(projects_dir.iterdir())
-        log.info(f"Claude projects directory: {projects_dir}")
-        log.info(f"Total files/directories: {len(files)}")
+        # Derive per-request options from the cached base (auto-approve for HTTP)
+        options = build_options(
+            resume=session_id,
+            model=model,
+            max_turns=max_turns,
+        )
+
+        cache_key = None
+        if response_cache and use_cache and not session_id:
+            cache_key = response_cache.key(prompt, options)
+            cached = await response_cache.get(cache_key)
+            if cached is not None:
+                log.info(f"Response cache hit: {cache_key[:12]}")
+                for response in cached:
+                    yield response
+                turn.finish()
+                yield {"type": "turn_complete", "session_id": None, "cached": True}
+                return
+
+        # Restore the session jsonl if this MicroVM does not have it yet
+        if session_id and session_persister:
+            started = time.perf_counter()
+            await session_persister.restore(session_id)
+            turn.record("session_restore", time.perf_counter() - started)
+        if session_id:
+            await compact_session(session_id, turn)
+
+        # Lease a warm Claude SDK Client from the pool
+        started = time.perf_counter()
+        await wait_for_warm_up()
+        async with client_pool.lease(options, session_id) as lease:
+            turn.record("client_start", time.perf_counter() - started)
+            turn.query_sent()
+            await lease.client.query(prompt)
+            recorded: list[dict[str, Any]] | None = [] if cache_key else None
+            async for response in stream_turn(
+                lease.client, lease, turn, transport=transport
+            ):
+                if recorded is not None:
+                    recorded.append(response)
+                yield response
+
+        if (
+            recorded is not None
+            and lease.completed
+            and not lease.tool_calls
+            and not any("error" in response for response in recorded)
+        ):
+            await response_cache.put(cache_key, recorded)  # type: ignore[union-attr]
+
+        # Persist only what this turn appended to the session jsonl
+        await save_session(lease.session_id)
+        log_turn_timings(turn.finish())
+        # As on WebSocket: callers resume (and route) follow-ups by this ID
+        yield {"type": "turn_complete", "session_id": lease.session_id}
 
-        for file_path in sorted(files):
-            file_type = "DIR" if file_path.is_dir() else "FILE"
-            log.info(f"  [{file_type}] {file_path.name}")
     except Exception as e:
-        log.error(f"Error reading Claude projects directory: {e}")
+        turn.finish(error=True)
+        error_msg = f"Invoke error: {str(e)}"
+        log.error(error_msg)
+        yield {"error": error_msg}
+
+
+async def invoke_batch(
+    prompts: list[Any], concurrency: int | None = None
+) -> AsyncIterator[dict[str, Any]]:
+    """
+    Run independent prompts concurrently and yield responses tagged by index.
+
+    At most `concurrency` prompts run at once, each on its own pooled client.
+    Items may be prompt strings or dicts with prompt/session_id/model/max_turns
+    and cache (False bypasses the response cache).
+    A failing item yields {"index": i, "error": ...} without affecting the
+    others; every item ends with {"index": i, "done": True}.
+    """
+    limit = max(1, min(concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue(maxsize=limit * 64)
+    items = iter(enumerate(prompts))
+
+    async def worker() -> None:
+        for index, item in items:
+            try:
+                if isinstance(item, str):
+                    item = {"prompt": item}
+                if not item.get("prompt"):
+                    await queue.put({"index": index, "error": "No prompt provided"})
+                    continue
+                async for response in run_prompt(
+                    item["prompt"],
+                    item.get("session_id"),
+                    model=item.get("model"),
+                    max_turns=item.get("max_turns"),
+                    transport="batch",
+                    use_cache=item.get("cache", True),
+                ):
+                    await queue.put({"index": index, **response})
+            except Exception as e:
+                await queue.put({"index": index, "error": f"Batch item error: {e}"})
+            finally:
+                await queue.put({"index": index, "done": True})
+
+    log.info(f"Starting batch: {len(prompts)} prompts, concurrency={limit}")
+    workers = [asyncio.create_task(worker()) for _ in range(min(limit, len(prompts)))]
+    remaining = len(prompts)
+    try:
+        while remaining:
+            response = await queue.get()
+            if response.get("done"):
+                remaining -= 1
+            yield response
+    finally:
+        for task in workers:
+            task.cancel()
 
 
 @app.entrypoint
@@ -69,269 +523,252 @@ async def invoke(event: dict[str, Any]):
     Expected event format:
         {
             "prompt": "Your message here",
-            "session_id": "optional-session-id"  # For conversation continuity
+            "session_id": "optional-session-id",  # For conversation continuity
+            "model": "optional-model-override",
+            "max_turns": 10,  # Optional max_turns override
+            "cache": false  # Optional, bypass the response cache
+        }
+
+    Batch event format (responses are tagged with the prompt index):
+        {
+            "prompts": ["First prompt", {"prompt": "Second", "session_id": "..."}],
+            "concurrency": 4  # Optional, capped by BATCH_MAX_CONCURRENCY
         }
     """
-    log.info(f"Invoke entrypoint called with event: {event}")
+    log.info(
+        "Invoke entrypoint called with event: %s",
+        truncate_payload(event, LOG_MAX_PAYLOAD_CHARS),
+    )
     log_claude_projects_files()
 
+    prompts = event.get("prompts")
+    if prompts is not None:
+        if not isinstance(prompts, list) or not prompts:
+            yield {"error": "prompts must be a non-empty list"}
+            return
+        concurrency = event.get("concurrency")
+        if concurrency is not None:
+            try:
+                concurrency = int(concurrency)
+            except (TypeError, ValueError):
+                yield {"error": "concurrency must be an integer"}
+                return
+        async for response in invoke_batch(prompts, concurrency):
+            yield response
+        return
+
     prompt = event.get("prompt", event.get("inputText", ""))
     if not prompt:
         yield {"error": "No prompt or inputText provided"}
         return
 
-    session_id = event.get("session_id")
-    if session_id:
-        log.info(f"Resuming session: {session_id}")
-    else:
-        log.info("Starting new session")
+    async for response in run_prompt(
+        prompt,
+        event.get("session_id"),
+        model=event.get("model"),
+        max_turns=event.get("max_turns"),
+        use_cache=event.get("cache", True),
+    ):
+        yield response
+
+
+def log_permission_stats(permissions: PermissionBroker) -> None:
+    """Log tool permission round-trips of the last turn and running totals."""
+    stats = permissions.stats
+    round_trips = stats["round_trips"]
+    average_ms = (
+        stats["approval_seconds_total"] / round_trips * 1000 if round_trips else 0.0
+    )
+    log.info(
+        f"Tool permissions: turn_round_trips={permissions.take_turn_round_trips()} "
+        f"requests={stats['requests']} cache_hits={stats['cache_hits']} "
+        f"round_trips={round_trips} timeouts={stats['timeouts']} "
+        f"approval_avg_ms={average_ms:.0f} "
+        f"approval_max_ms={stats['approval_seconds_max'] * 1000:.0f}"
+    )
+
+
+@app.websocket
+async def websocket_handler(websocket, context):
+    """
+    WebSocket handler for persistent, multi-turn bidirectional streaming.
+
+    One ClaudeSDKClient is kept alive for the whole connection and prompts are
+    processed in order, so follow-up prompts skip the CLI start and resume.
+    Frames are received, processed and sent by separate tasks: tool permission
+    responses and interrupts are handled while a turn is streaming, and
+    responses go through a bounded outbound queue so a slow client applies
+    back-pressure instead of buffering without limit.
+
+    Client -> agent frames:
+        {"prompt": "...", "session_id": "optional-session-id"}  # First prompt
+        {"prompt": "..."}  # Follow-up prompts on the same conversation
+        # A follow-up with a different session_id is answered with an error
+        {"type": "interrupt"}
+        {"type": "tool_permission_response", "request_id": "...", "approved": true,
+         "scope": "once|input|pattern|tool", "pattern": "git *"}
+
+    Agent -> client frames:
+        Response dicts as in invoke, tool_permission_request frames and
+        {"type": "turn_complete", "session_id": "..."} after every prompt.
+    """
+    log.info(f"WebSocket connection established. Context: {context}")
+    log_claude_projects_files()
 
-    try:
-        # Configure Claude Agent SDK options (auto-approve for HTTP)
-        options = ClaudeAgentOptions(
-            model="claude-sonnet-4-5",
-            allowed_tools=[
-                "Read",
-                "Write",
-                "Bash",
-                "Edit",
-                "Glob",
-                "Grep",
-                "mcp__tools__add_numbers",
-                "mcp__tools__multiply_numbers",
-            ],
-            mcp_servers={"tools": tools_server},
-            permission_mode="acceptEdits",
-            system_prompt="""
-            You are a helpful assistant with various capabilities:
-            - You can read, write, and edit files
-            - You can run bash commands
-            - You can use custom tools like add_numbers and multiply_numbers
-            - You can search through files using Glob and Grep
-
-            Always be helpful, clear, and precise in your responses.
-            When using tools, explain what you're doing.
-            """,
-            max_turns=10,
-            include_partial_messages=True,
+    await websocket.accept()
+
+    outbound: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue(
+        maxsize=WS_OUTBOUND_QUEUE_SIZE
+    )
+    prompts: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue()
+    connection: dict[str, ClaudeSDKClient] = {}
+    permissions = PermissionBroker(
+        outbound.put,
+        PermissionPolicyCache(
+            max_entries=PERMISSION_CACHE_SIZE, ttl=PERMISSION_CACHE_TTL
+        ),
+        timeout=WS_PERMISSION_TIMEOUT,
+    )
+
+    async def send_frames() -> None:
+        while (frame := await outbound.get()) is not None:
+            await websocket.send_json(frame)
+
+    async def receive_frames() -> None:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                data = json.loads(text)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict):
+                # A bad frame is answered, the connection stays open
+                await outbound.put({"error": "Invalid frame: expected a JSON object"})
+                continue
+            frame_type = data.get("type")
+
+            if frame_type == "tool_permission_response":
+                permissions.resolve(data)
+
+            elif frame_type == "interrupt":
+                client = connection.get("client")
+                if client:
+                    log.info("Interrupting current turn")
+                    await client.interrupt()
+
+            else:
+                await prompts.put(data)
+
+    # Claude session the connection's CLI holds, see compact_session
+    held: str | None = None
+
+    async def run_turns() -> None:
+        nonlocal held
+        data = await prompts.get()
+        session_id = data.get("session_id") if data else None
+        if session_id:
+            log.info(f"Resuming session: {session_id}")
+            if session_persister:
+                await session_persister.restore(session_id)
+            await compact_session(session_id)
+        else:
+            log.info("Starting new session")
+
+        # Configure Claude Agent SDK options with permission system
+        options = build_options(
             resume=session_id,
+            permission_mode="default",
+            can_use_tool=permissions,
         )
 
-        # Use Claude SDK Client
+        started = time.perf_counter()
+        held = hold_session(held, session_id)
         async with ClaudeSDKClient(options=options) as client:
-            await client.query(prompt)
-
-            tool_map: dict[str, str] = {}
-
-            # Stream response events
-            async for msg in client.receive_response():
-                if isinstance(msg, StreamEvent):
-                    log.info("StreamEvent")
-                    log.info(f"Event: {msg}")
-                    response = handle_stream_event(msg)
-                    if response:
-                        yield response
-                elif isinstance(msg, UserMessage):
-                    log.info("UserMessage")
-                    log.info(f"User: {msg}")
-                    responses = handle_user_message(msg, tool_map)
-                    for response in responses:
-                        yield response
-                elif isinstance(msg, AssistantMessage):
-                    log.info("AssistantMessage")
-                    log.info(f"Claude: {msg}")
-                    responses = handle_assistant_message(msg, tool_map)
-                    for response in responses:
-                        yield response
-                elif isinstance(msg, SystemMessage):
-                    log.info("SystemMessage")
-                    log.info(f"System: {msg}")
-                    handle_system_message(msg)
-                elif isinstance(msg, ResultMessage):
-                    log.info("ResultMessage")
-                    log.info(f"Result: {msg}")
-                    log.info(f"Cost: {msg.total_cost_usd}")
-                    yield handle_result_message(msg)
+            connection["client"] = client
+            client_start: float | None = time.perf_counter() - started
+            while data is not None:
+                prompt = data.get("prompt", data.get("inputText", ""))
+                frame_session = data.get("session_id")
+                if not prompt:
+                    await outbound.put({"error": "No prompt or inputText provided"})
+                elif frame_session and frame_session != session_id:
+                    # The connection's CLI holds one conversation
+                    await outbound.put(
+                        {
+                            "error": f"Session mismatch: this connection holds "
+                            f"session {session_id or '(new)'}, not {frame_session}"
+                        }
+                    )
                 else:
-                    log.warning(f"Unexpected message type found: {type(msg)}")
+                    turn = TurnMetrics("websocket")
+                    if client_start is not None:
+                        # Only the first turn of a connection starts the CLI
+                        turn.record("client_start", client_start)
+                        client_start = None
+                    lease = Lease(client=client, session_id=session_id)
+                    turn.query_sent()
+                    await client.query(prompt)
+                    async for response in stream_turn(
+                        client, lease, turn, transport="websocket"
+                    ):
+                        await outbound.put(response)
+                    session_id = lease.session_id or session_id
+                    held = hold_session(held, session_id)
+                    await save_session(session_id)
+                    log_turn_timings(turn.finish())
+                    log_permission_stats(permissions)
+                    await outbound.put(
+                        {"type": "turn_complete", "session_id": session_id}
+                    )
+                data = await prompts.get()
+
+    sender = asyncio.create_task(send_frames())
+    receiver = asyncio.create_task(receive_frames())
+    turns = asyncio.create_task(run_turns())
+    try:
+        done, _ = await asyncio.wait(
+            {sender, receiver, turns}, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            if not task.cancelled() and task.exception():
+                raise task.exception()  # type: ignore[misc]
+
+    except WebSocketDisconnect:
+        log.info("WebSocket client disconnected")
 
     except Exception as e:
-        error_msg = f"Invoke error: {str(e)}"
+        error_msg = f"WebSocket connection error: {str(e)}"
         log.error(error_msg)
-        yield {"error": error_msg}
-
-
-# @app.websocket
-# async def websocket_handler(websocket, context):
-#     """
-#     WebSocket handler for bidirectional streaming.
-#     Enables real-time, continuous conversations with interrupt support.
-
-#     Expected message format:
-#         {
-#             "prompt": "Your message here",
-#             "session_id": "optional-session-id"  # For conversation continuity
-#         }
-#     """
-#     log.info(f"WebSocket connection established. Context: {context}")
-
-#     # Log Claude projects files at the start
-#     log_claude_projects_files()
-
-#     # Accept the WebSocket connection
-#     await websocket.accept()
-
-#     # WebSocketスコープ内でcan_use_toolハンドラーを定義（クロージャ）
-#     async def can_use_tool_with_approval(
-#         tool_name: str,
-#         input_data: dict[str, Any],
-#         tool_context: Any,
-#     ) -> dict[str, Any]:
-#         """WebSocket経由でユーザー承認を待つツール実行ハンドラー."""
-
-#         # websocketへはクロージャでアクセス
-#         if not websocket:
-#             log.warning(
-#                 f"WebSocket not available for tool {tool_name},"""
-#                 "auto-approving"
-#             )
-#             return {"behavior": "allow", "updatedInput": input_data}
-
-#         log.info(f"Requesting permission for tool: {tool_name}")
-#         await websocket.send_json(
-#             {
-#                 "type": "tool_permission_request",
-#                 "tool_name": tool_name,
-#                 "input": input_data,
-#             }
-#         )
-
-#         try:
-#             response = await asyncio.wait_for(websocket.receive_json(), timeout=30.0)
-
-#             if response.get("type") == "tool_permission_response":
-#                 approved = response.get("approved", False)
-
-#                 if approved:
-#                     log.info(f"Tool {tool_name} approved by user")
-#                     return {"behavior": "allow", "updatedInput": input_data}
-#                 else:
-#                     log.info(f"Tool {tool_name} denied by user")
-#                     return {
-#                         "behavior": "deny",
-#                         "message": "User denied permission for this tool",
-#                     }
-#             else:
-#                 log.warning(f"Unexpected response type: {response.get('type')}")
-#                 return {"behavior": "deny", "message": "Invalid permission response"}
-
-#         except TimeoutError:
-#             log.warning(f"Tool {tool_name} permission request timed out")
-#             return {
-#                 "behavior": "deny",
-#                 "message": "Permission request timed out (30s)",
-#             }
-#         except Exception as e:
-#             log.error(f"Error in permission request for {tool_name}: {e}")
-#             return {"behavior": "deny", "message": f"Permission error: {str(e)}"}
-
-#     try:
-#         # Receive message from client to get session_id
-#         data = await websocket.receive_json()
-#         log.info(f"Received WebSocket message: {data}")
-
-#         prompt = data.get("prompt", data.get("inputText", ""))
-#         if not prompt:
-#             await websocket.send_json({"error": "No prompt or inputText provided"})
-#             return
-
-#         session_id = data.get("session_id")
-#         if session_id:
-#             log.info(f"Resuming session: {session_id}")
-#         else:
-#             log.info("Starting new session")
-
-#         # Configure Claude Agent SDK options with permission system
-#         options = ClaudeAgentOptions(
-#             model="claude-sonnet-4-5",
-#             allowed_tools=[
-#                 "Read",
-#                 "Write",
-#                 "Bash",
-#                 "Edit",
-#                 "Glob",
-#                 "Grep",
-#                 "mcp__tools__add_numbers",
-#                 "mcp__tools__multiply_numbers",
-#             ],
-#             mcp_servers={"tools": tools_server},
-#             can_use_tool=can_use_tool_with_approval,
-#             permission_mode="default",
-#             system_prompt="""
-#             You are a helpful assistant with various capabilities:
-#             - You can read, write, and edit files
-#             - You can run bash commands
-#             - You can use custom tools like add_numbers and multiply_numbers
-#             - You can search through files using Glob and Grep
-
-#             Always be helpful, clear, and precise in your responses.
-#             When using tools, explain what you're doing.
-#             """,
-#             max_turns=10,
-#             include_partial_messages=True,
-#             resume=session_id,
-#         )
-
-#         # Use Claude SDK Client
-#         async with ClaudeSDKClient(options=options) as client:
-#             # Send the user's query to Claude
-#             await client.query(prompt)
-
-#             tool_map: dict[str, str] = {}
-
-#             # Stream the response back to client
-#             async for msg in client.receive_response():
-#                 if isinstance(msg, StreamEvent):
-#                     log.info("StreamEvent")
-#                     log.info(f"Event: {msg}")
-#                     response = handle_stream_event(msg)
-#                     if response:
-#                         await websocket.send_json(response)
-#                 elif isinstance(msg, UserMessage):
-#                     log.info("UserMessage")
-#                     log.info(f"User: {msg}")
-#                     responses = handle_user_message(msg, tool_map)
-#                     for response in responses:
-#                         await websocket.send_json(response)
-#                 elif isinstance(msg, AssistantMessage):
-#                     log.info("AssistantMessage")
-#                     log.info(f"Claude: {msg}")
-#                     responses = handle_assistant_message(msg, tool_map)
-#                     for response in responses:
-#                         await websocket.send_json(response)
-#                 elif isinstance(msg, SystemMessage):
-#                     log.info("SystemMessage")
-#                     log.info(f"System: {msg}")
-#                     handle_system_message(msg)
-#                 elif isinstance(msg, ResultMessage):
-#                     log.info("ResultMessage")
-#                     log.info(f"Result: {msg}")
-#                     log.info(f"Cost: {msg.total_cost_usd}")
-#                     await websocket.send_json(handle_result_message(msg))
-#                 else:
-#                     log.warning(f"Unexpected message type found: {type(msg)}")
-
-#     except Exception as e:
-#         error_msg = f"WebSocket connection error: {str(e)}"
-#         log.error(error_msg)
-#         try:
-#             await websocket.send_json({"error": error_msg})
-#         except Exception:
-#             log.error("Failed to send error message to client")
-
-#     finally:
-#         log.info("Closing WebSocket connection")
-#         await websocket.close()
+        # Through the sender, which may still be writing queued frames
+        try:
+            outbound.put_nowait({"error": error_msg})
+        except asyncio.QueueFull:
+            log.error("Failed to send error message to client")
+
+    finally:
+        for task in (receiver, turns):
+            task.cancel()
+        # Flush queued frames before closing
+        try:
+            outbound.put_nowait(None)
+            await asyncio.wait_for(sender, timeout=5.0)
+        except Exception:
+            sender.cancel()
+        hold_session(held, None)
+        log.info("Closing WebSocket connection")
+        with contextlib.suppress(Exception):
+            await websocket.close()
+
+
+async def metrics_endpoint(request: Request) -> PlainTextResponse:
+    """Serve latency and throughput metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+if os.getenv("METRICS_ENDPOINT", "1") == "1":
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"])
+startup.mark("routes")
+log.info(f"Startup timings: {startup.summary()}")
 
 
 if __name__ == "__main__":
@@ -1,5 +1,7 @@
 """Message handling functions for Claude Agent SDK responses."""
 
+import dataclasses
+from collections.abc import Callable, Iterable, Iterator
 from typing import Any
 
 from claude_agent_sdk import (
@@ -13,67 +15,258 @@ from claude_agent_sdk import (
 )
 from claude_agent_sdk.types import StreamEvent
 
+from src.log_utils import get_logger
+from src.tool_calls import ToolCallTracker
 
-def handle_stream_event(msg: StreamEvent) -> dict[str, Any] | None:
+log = get_logger("message")
+
+# Handlers return a response dict, an iterable of response dicts or None
+Response = dict[str, Any] | Iterable[dict[str, Any]] | None
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class ToolResultPolicy:
     """
-    Handle StreamEvent messages and return response dict.
+    How tool results are forwarded to the client.
+
+    Text beyond max_chars (0 = unlimited) is truncated, and what is
+    forwarded is split into frames of at most chunk_chars. Image data is
+    only forwarded when forward_images is set.
+    """
+
+    max_chars: int = 65536
+    chunk_chars: int = 8192
+    forward_images: bool = False
+
+
+@dataclasses.dataclass(slots=True)
+class TurnContext:
+    """Per-turn state shared by the message handlers."""
+
+    tools: ToolCallTracker = dataclasses.field(default_factory=ToolCallTracker)
+    tool_results: ToolResultPolicy = ToolResultPolicy()
+    # Set once the ResultMessage of the turn arrived
+    result: ResultMessage | None = None
+
+
+MessageHandler = Callable[[Any, TurnContext], Response]
+# Stream event handlers receive the raw event dict instead of the StreamEvent
+StreamEventHandler = Callable[[dict[str, Any], TurnContext], Response]
+
 
-    StreamEvent contains real-time streaming data from Claude:
-    - content_block_start: Start of a content block (text or tool_use)
-    - content_block_delta: Incremental content updates
-    - content_block_stop: End of a content block
+class MessageRouter:
     """
-    if msg.event["type"] == "content_block_start":
-        # Check if this is a tool_use block
-        content_block = msg.event.get("content_block", {})
-        if content_block.get("type") == "tool_use":
-            tool_name = content_block.get("name", "Unknown")
-            return {"event": f"🔧 {tool_name}"}
-        return {"event": "content_block_start"}
+    Dispatch table from message types to handlers.
+
+    Messages are looked up by exact type; StreamEvents are routed by their
+    event type, and content_block_delta events by their delta type, so the
+    per-token path is two dict lookups. Unregistered stream events produce
+    no response.
+    """
+
+    def __init__(self):
+        self._handlers: dict[type, MessageHandler] = {}
+        # _handlers plus resolved subclasses and unexpected types
+        self._lookup: dict[type, MessageHandler] = {}
+        self._event_handlers: dict[str, StreamEventHandler] = {}
+        self._delta_handlers: dict[str, StreamEventHandler] = {}
+
+    def register(self, message_type: type, handler: MessageHandler) -> None:
+        """Handle messages of exactly message_type (subclasses on first use)."""
+        self._handlers[message_type] = handler
+        self._lookup = dict(self._handlers)
+
+    def register_event(self, event_type: str, handler: StreamEventHandler) -> None:
+        """Handle StreamEvents whose event["type"] is event_type."""
+        self._event_handlers[event_type] = handler
+
+    def register_delta(self, delta_type: str, handler: StreamEventHandler) -> None:
+        """Handle content_block_delta StreamEvents by event["delta"]["type"]."""
+        self._delta_handlers[delta_type] = handler
+
+    def copy(self) -> "MessageRouter":
+        """Return a router with the same handlers, to be customized separately."""
+        router = MessageRouter()
+        router._handlers.update(self._handlers)
+        router._lookup.update(self._handlers)
+        router._event_handlers.update(self._event_handlers)
+        router._delta_handlers.update(self._delta_handlers)
+        return router
+
+    def dispatch(self, msg: Any, context: TurnContext) -> Response:
+        if type(msg) is StreamEvent:
+            event = msg.event
+            event_type = event["type"]
+            if event_type == "content_block_delta":
+                handler = self._delta_handlers.get(event["delta"]["type"])
+            else:
+                handler = self._event_handlers.get(event_type)
+            return handler(event, context) if handler else None
+
+        handler = self._lookup.get(type(msg))
+        if handler is None:
+            handler = self._resolve(type(msg))
+        return handler(msg, context)
+
+    def _resolve(self, message_type: type) -> MessageHandler:
+        handler = next(
+            (
+                h
+                for registered, h in self._handlers.items()
+                if issubclass(message_type, registered)
+            ),
+            _unexpected,
+        )
+        self._lookup[message_type] = handler
+        return handler
+
 
-    elif msg.event["type"] == "content_block_stop":
-        return {"event": "content_block_stop"}
+def _unexpected(msg: Any, context: TurnContext) -> None:
+    log.warning(f"Unexpected message type found: {type(msg)}")
 
-    elif msg.event["type"] == "content_block_delta":
-        if msg.event["delta"]["type"] == "text_delta":
-            # Stream text content in real-time
-            text = msg.event.get("delta", {}).get("text", "")
-            return {"event": text}
-        elif msg.event["delta"]["type"] == "input_json_delta":
-            # Don't send tool argument streaming (too verbose)
-            return None
 
-    return None
+def handle_content_block_start(
+    event: dict[str, Any], context: TurnContext
+) -> dict[str, Any]:
+    """Start of a content block (text or tool_use)."""
+    content_block = event.get("content_block", {})
+    if content_block.get("type") == "tool_use":
+        tool_name = content_block.get("name", "Unknown")
+        return {"event": f"🔧 {tool_name}"}
+    return {"event": "content_block_start"}
+
+
+def handle_content_block_stop(
+    event: dict[str, Any], context: TurnContext
+) -> dict[str, Any]:
+    """End of a content block."""
+    return {"event": "content_block_stop"}
+
+
+def handle_text_delta(event: dict[str, Any], context: TurnContext) -> dict[str, Any]:
+    """Stream text content in real-time."""
+    return {"event": event["delta"].get("text", "")}
 
 
 def handle_user_message(
-    msg: UserMessage, tool_map: dict[str, str]
-) -> list[dict[str, Any]]:
+    msg: UserMessage, context: TurnContext
+) -> Iterator[dict[str, Any]]:
     """
-    Handle UserMessage messages and return list of response dicts.
+    Handle UserMessage messages and yield response dicts.
 
     UserMessage contains tool execution results from the system.
     Only send ToolResultBlock content (tool execution results).
     """
-    responses = []
+    if isinstance(msg.content, str):
+        return
+    tools = context.tools
     for block in msg.content:
         if isinstance(block, TextBlock):
             # Don't send - UserMessage TextBlocks are rare and not important
             pass
         elif isinstance(block, ToolUseBlock):
-            # Register tool name for later reference, but don't send
-            tool_map[block.id] = block.name
+            # Register tool call for later reference, but don't send
+            tools.start(block.id, block.name)
         elif isinstance(block, ToolResultBlock):
-            # Send tool execution result
-            tool_name = tool_map.get(block.tool_use_id, "Unknown")
-            if block.content and len(block.content) > 0:
-                result_text = block.content[0].get("text", "")
-                responses.append({"result": f"✅ {tool_name}: {result_text}"})
-    return responses
+            # Send tool execution result (the call is no longer tracked)
+            call = tools.finish(block.tool_use_id)
+            tool_name = call.name if call else "Unknown"
+            yield from iter_tool_result(block, tool_name, context.tool_results)
+
+
+def iter_tool_result(
+    block: ToolResultBlock, tool_name: str, policy: ToolResultPolicy
+) -> Iterator[dict[str, Any]]:
+    """
+    Yield the frames forwarding one tool result.
+
+    A single text item that fits in one chunk is sent as one frame:
+        {"result": "✅ tool: text"}
+
+    Anything else starts with a header frame and continues with one frame
+    per chunk or item, slicing the original strings lazily:
+        {"result": "✅ tool (N chars)", "tool_result": {...sizes...}}
+        {"result_chunk": "...", "tool_use_id": "...", "item": 0}
+        {"result_image": {"tool_use_id": "...", "item": 1, ...}}
+        {"result_item": {"tool_use_id": "...", "item": 2, "type": "..."}}
+    """
+    content = block.content
+    if not content:
+        return
+    items = [{"type": "text", "text": content}] if isinstance(content, str) else content
+
+    total_chars = sum(len(item.get("text", "")) for item in items)
+    limit = policy.max_chars or total_chars
+    chunk = max(1, policy.chunk_chars)
+    if (
+        len(items) == 1
+        and items[0].get("type") == "text"
+        and total_chars <= min(limit, chunk)
+    ):
+        yield {"result": f"✅ {tool_name}: {items[0].get('text', '')}"}
+        return
+
+    truncated = total_chars > limit
+    summary = f"{total_chars:,} chars"
+    if truncated:
+        summary += f", showing first {limit:,}"
+    yield {
+        "result": f"✅ {tool_name} ({summary})",
+        "tool_result": {
+            "tool_use_id": block.tool_use_id,
+            "tool": tool_name,
+            "items": len(items),
+            "total_chars": total_chars,
+            "truncated": truncated,
+            "is_error": bool(block.is_error),
+        },
+    }
+
+    remaining = limit
+    for index, item in enumerate(items):
+        item_type = item.get("type")
+        if item_type == "text":
+            text = item.get("text", "")
+            end = min(len(text), remaining)
+            remaining -= end
+            for start in range(0, end, chunk):
+                yield {
+                    "result_chunk": text[start : min(start + chunk, end)],
+                    "tool_use_id": block.tool_use_id,
+                    "item": index,
+                }
+        elif item_type == "image":
+            # Anthropic ({"source": {...}}) and MCP ({"data", "mimeType"}) shapes
+            source = item.get("source") or item
+            data = source.get("data") or ""
+            yield {
+                "result_image": {
+                    "tool_use_id": block.tool_use_id,
+                    "item": index,
+                    "media_type": source.get("media_type") or source.get("mimeType"),
+                    "bytes": len(data) * 3 // 4,
+                }
+            }
+            if policy.forward_images:
+                for start in range(0, len(data), chunk):
+                    yield {
+                        "result_chunk": data[start : start + chunk],
+                        "tool_use_id": block.tool_use_id,
+                        "item": index,
+                        "encoding": "base64",
+                    }
+        else:
+            yield {
+                "result_item": {
+                    "tool_use_id": block.tool_use_id,
+                    "item": index,
+                    "type": item_type,
+                }
+            }
 
 
 def handle_assistant_message(
-    msg: AssistantMessage, tool_map: dict[str, str]
+    msg: AssistantMessage, context: TurnContext
 ) -> list[dict[str, Any]]:
     """
     Handle AssistantMessage messages and return list of response dicts.
@@ -82,21 +275,22 @@ def handle_assistant_message(
     Since we already streamed TextBlocks via StreamEvent, don't send them again.
     Just register ToolUseBlocks for reference.
     """
+    tools = context.tools
     responses = []
     for block in msg.content:
         if isinstance(block, TextBlock):
             # Don't send - already streamed via text_delta events
             pass
         elif isinstance(block, ToolUseBlock):
-            # Register tool name for later reference, but don't send
-            tool_map[block.id] = block.name
+            # Register tool call for later reference, but don't send
+            tools.start(block.id, block.name)
         elif isinstance(block, ToolResultBlock):
             # Don't send - will be handled in UserMessage
             pass
     return responses
 
 
-def handle_system_message(msg: SystemMessage) -> None:
+def handle_system_message(msg: SystemMessage, context: TurnContext) -> None:
     """
     Handle SystemMessage messages.
 
@@ -106,10 +300,37 @@ def handle_system_message(msg: SystemMessage) -> None:
     pass
 
 
-def handle_result_message(msg: ResultMessage) -> dict[str, Any]:
+# Prefix of the result frame reporting the cost of a turn
+COST_PREFIX = "💰 Cost: $"
+
+
+def handle_result_message(msg: ResultMessage, context: TurnContext) -> dict[str, Any]:
     """
     Handle ResultMessage messages and return response dict.
 
     ResultMessage contains final summary with cost and usage information.
+    The message is kept on the context so the session ID can be recorded.
     """
-    return {"result": f"💰 Cost: ${msg.total_cost_usd}"}
+    log.info(f"Cost: {msg.total_cost_usd}")
+    context.result = msg
+    return {"result": f"{COST_PREFIX}{msg.total_cost_usd}"}
+
+
+# Default handlers shared by all transports
+router = MessageRouter()
+router.register(UserMessage, handle_user_message)
+router.register(AssistantMessage, handle_assistant_message)
+router.register(SystemMessage, handle_system_message)
+router.register(ResultMessage, handle_result_message)
+router.register_event("content_block_start", handle_content_block_start)
+router.register_event("content_block_stop", handle_content_block_stop)
+router.register_delta("text_delta", handle_text_delta)
+
+# Per-transport routers, customizable without affecting the others
+TRANSPORTS = ("sse", "websocket", "batch")
+_transport_routers = {transport: router.copy() for transport in TRANSPORTS}
+
+
+def get_router(transport: str) -> MessageRouter:
+    """Return the router of a transport ("sse", "websocket" or "batch")."""
+    return _transport_routers[transport]
@@ -0,0 +1,197 @@
+"""Per-request latency and throughput metrics in Prometheus text format."""
+
+import bisect
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
+from claude_agent_sdk import Message, ResultMessage
+from claude_agent_sdk.types import StreamEvent
+
+from src.tool_calls import ToolCall
+
+# Bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+GAP_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets."""
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels: tuple[tuple[str, str], ...], **extra: str) -> str:
+    items = [*labels, *extra.items()]
+    if not items:
+        return ""
+    inner = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + inner + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Counters and histograms rendered in the Prometheus text format."""
+
+    def __init__(self):
+        # name -> (type, help)
+        self._meta: dict[str, tuple[str, str]] = {}
+        self._counters: dict[tuple[str, tuple], float] = {}
+        self._histograms: dict[tuple[str, tuple], Histogram] = {}
+        self._buckets: dict[str, tuple[float, ...]] = {}
+
+    def counter(self, name: str, help_text: str) -> None:
+        self._meta[name] = ("counter", help_text)
+
+    def gauge(self, name: str, help_text: str) -> None:
+        self._meta[name] = ("gauge", help_text)
+
+    def histogram(
+        self, name: str, help_text: str, buckets: tuple[float, ...] = LATENCY_BUCKETS
+    ) -> None:
+        self._meta[name] = ("histogram", help_text)
+        self._buckets[name] = buckets
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        """Set a gauge (stored alongside counters)."""
+        self._counters[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(self._buckets[name])
+        histogram.observe(value)
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text) in self._meta.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind in ("counter", "gauge"):
+                for (key_name, labels), value in self._counters.items():
+                    if key_name == name:
+                        lines.append(f"{name}{_labels(labels)} {value:g}")
+                continue
+            for (key_name, labels), hist in self._histograms.items():
+                if key_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts, strict=False):
+                    cumulative += count
+                    le = _labels(labels, le=f"{bound:g}")
+                    lines.append(f"{name}_bucket{le} {cumulative}")
+                le = _labels(labels, le="+Inf")
+                lines.append(f"{name}_bucket{le} {hist.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {hist.sum:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.counter("agent_turns_total", "Completed agent turns")
+registry.counter("agent_turn_errors_total", "Agent turns that failed")
+registry.counter("agent_output_tokens_total", "Output tokens reported by Claude")
+registry.histogram("agent_session_restore_seconds", "Time to restore the session jsonl")
+registry.histogram(
+    "agent_client_start_seconds", "Time to lease a connected Claude SDK client"
+)
+registry.histogram(
+    "agent_time_to_first_text_seconds", "Time from query to the first text delta"
+)
+registry.histogram(
+    "agent_text_delta_gap_seconds", "Gap between consecutive text deltas", GAP_BUCKETS
+)
+registry.histogram("agent_tool_duration_seconds", "Tool use to tool result time")
+registry.histogram("agent_turn_seconds", "Total wall time of a turn")
+
+
+class TurnMetrics:
+    """
+    Timings of one turn, recorded into a MetricsRegistry.
+
+    watch() observes the raw message stream (before text delta coalescing),
+    so gaps are measured between the deltas Claude actually sent. Tool
+    durations come from the turn's ToolCallTracker via tool_completed().
+    """
+
+    def __init__(self, transport: str, metrics: MetricsRegistry = registry):
+        self.transport = transport
+        self.metrics = metrics
+        self.started = time.perf_counter()
+        self.timings: dict[str, float] = {}
+        self._query_sent: float | None = None
+        self._last_delta: float | None = None
+
+    def record(self, phase: str, seconds: float) -> None:
+        """Record a phase measured by the caller (restore, client_start)."""
+        self.timings[phase] = seconds
+        self.metrics.observe(
+            f"agent_{phase}_seconds", seconds, transport=self.transport
+        )
+
+    def query_sent(self) -> None:
+        self._query_sent = time.perf_counter()
+
+    def tool_completed(self, call: ToolCall) -> None:
+        self.metrics.observe(
+            "agent_tool_duration_seconds", call.duration or 0.0, tool=call.name
+        )
+
+    async def watch(self, messages: AsyncIterator[Message]) -> AsyncIterator[Message]:
+        async for msg in messages:
+            self._observe(msg)
+            yield msg
+
+    def _observe(self, msg: Message) -> None:
+        now = time.perf_counter()
+        if isinstance(msg, StreamEvent):
+            event = msg.event
+            if (
+                event.get("type") == "content_block_delta"
+                and event.get("delta", {}).get("type") == "text_delta"
+            ):
+                if self._last_delta is None:
+                    first = now - (self._query_sent or self.started)
+                    self.record("time_to_first_text", first)
+                else:
+                    self.metrics.observe(
+                        "agent_text_delta_gap_seconds",
+                        now - self._last_delta,
+                        transport=self.transport,
+                    )
+                self._last_delta = now
+        elif isinstance(msg, ResultMessage):
+            output_tokens = (msg.usage or {}).get("output_tokens")
+            if output_tokens:
+                self.timings["output_tokens"] = output_tokens
+                self.metrics.inc(
+                    "agent_output_tokens_total",
+                    output_tokens,
+                    transport=self.transport,
+                )
+
+    def finish(self, error: bool = False) -> dict[str, Any]:
+        """Record the total wall time and return the timings of this turn."""
+        self.record("turn", time.perf_counter() - self.started)
+        name = "agent_turn_errors_total" if error else "agent_turns_total"
+        self.metrics.inc(name, transport=self.transport)
+        return self.timings
@@ -0,0 +1,148 @@
+"""Claude Agent SDK options shared by all entrypoints."""
+
+import dataclasses
+import functools
+import hashlib
+import importlib
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from claude_agent_sdk import ClaudeAgentOptions
+
+CONFIG_PATH = Path(__file__).resolve().parent.parent / ".bedrock_agentcore.yaml"
+
+ALLOWED_TOOLS = [
+    "Read",
+    "Write",
+    "Bash",
+    "Edit",
+    "Glob",
+    "Grep",
+    "mcp__tools__add_numbers",
+    "mcp__tools__multiply_numbers",
+    "mcp__tools__sum_numbers",
+    "mcp__tools__product_numbers",
+    "mcp__tools__dot_product",
+    "mcp__tools__elementwise",
+]
+
+SYSTEM_PROMPT = """
+You are a helpful assistant with various capabilities:
+- You can read, write, and edit files
+- You can run bash commands
+- You can use custom tools like add_numbers and multiply_numbers
+- For many numbers, use one call of sum_numbers, product_numbers,
+  dot_product or elementwise instead of repeated add/multiply calls
+- You can search through files using Glob and Grep
+
+Always be helpful, clear, and precise in your responses.
+When using tools, explain what you're doing.
+"""
+
+# Options that may be overridden from .bedrock_agentcore.yaml or env
+_ENV_OVERRIDES = {
+    "model": ("CLAUDE_MODEL", str),
+    "max_turns": ("CLAUDE_MAX_TURNS", int),
+    "permission_mode": ("CLAUDE_PERMISSION_MODE", str),
+}
+
+
+@functools.cache
+def _yaml() -> Any:
+    """Import PyYAML on first use (None if not installed)."""
+    try:
+        return importlib.import_module("yaml")
+    except ImportError:
+        return None
+
+
+def load_overrides(config_path: Path = CONFIG_PATH) -> dict[str, Any]:
+    """
+    Load option overrides.
+
+    Values come from the `claude_agent_options` mapping of the default agent
+    in .bedrock_agentcore.yaml (when PyYAML is available), then from env
+    (CLAUDE_MODEL, CLAUDE_MAX_TURNS, CLAUDE_PERMISSION_MODE), env winning.
+    """
+    overrides: dict[str, Any] = {}
+
+    yaml = _yaml() if config_path.is_file() else None
+    if yaml is not None:
+        config = yaml.safe_load(config_path.read_text()) or {}
+        agent = config.get("agents", {}).get(config.get("default_agent"), {})
+        section = agent.get("claude_agent_options") or {}
+        overrides.update({k: v for k, v in section.items() if k in _ENV_OVERRIDES})
+
+    for name, (env_var, cast) in _ENV_OVERRIDES.items():
+        value = os.getenv(env_var)
+        if value:
+            overrides[name] = cast(value)
+
+    return overrides
+
+
+@functools.cache
+def base_options() -> ClaudeAgentOptions:
+    """
+    Return the immutable base options (auto-approve for HTTP).
+
+    Built once on first use, after .env has been loaded. The custom tools
+    (and their MCP server) are imported here rather than at startup.
+    """
+    from src.tools import get_tools_server
+
+    options = ClaudeAgentOptions(
+        model="claude-sonnet-4-5",
+        allowed_tools=ALLOWED_TOOLS,
+        mcp_servers={"tools": get_tools_server()},
+        permission_mode="acceptEdits",
+        system_prompt=SYSTEM_PROMPT,
+        max_turns=10,
+        include_partial_messages=True,
+    )
+    return dataclasses.replace(options, **load_overrides())
+
+
+def options_fingerprint(options: ClaudeAgentOptions, stable: bool = False) -> str:
+    """
+    Return a fingerprint of options, ignoring resume.
+
+    Non-JSON values (MCP server instances, callbacks) are identified by
+    object identity, so two option sets only match when they share them.
+    With stable=True they are identified by type (paths by value) instead,
+    so the fingerprint is the same across processes.
+    """
+    values = {
+        f.name: getattr(options, f.name)
+        for f in dataclasses.fields(options)
+        if f.name != "resume"
+    }
+
+    def default(obj: Any) -> str:
+        if not stable:
+            return f"{type(obj).__name__}@{id(obj)}"
+        return os.fspath(obj) if isinstance(obj, os.PathLike) else type(obj).__name__
+
+    encoded = json.dumps(values, sort_keys=True, default=default)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def build_options(
+    resume: str | None = None,
+    model: str | None = None,
+    max_turns: int | None = None,
+    **overrides: Any,
+) -> ClaudeAgentOptions:
+    """
+    Derive per-request options from base_options().
+
+    This is a shallow copy: list/dict fields are shared with the base and
+    must not be mutated.
+    """
+    if model:
+        overrides["model"] = model
+    if max_turns:
+        overrides["max_turns"] = max_turns
+    return dataclasses.replace(base_options(), resume=resume, **overrides)
@@ -0,0 +1,286 @@
+"""Tool permission handling for interactive (WebSocket) sessions."""
+
+import asyncio
+import fnmatch
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from claude_agent_sdk import (
+    PermissionResultAllow,
+    PermissionResultDeny,
+    ToolPermissionContext,
+)
+
+from src.log_utils import get_logger
+from src.metrics import registry as metrics
+
+log = get_logger("permissions")
+
+metrics.counter("agent_permission_requests_total", "Tool permission checks")
+metrics.counter("agent_permission_cache_hits_total", "Permissions answered from cache")
+metrics.counter("agent_permission_round_trips_total", "Permissions asked the client")
+metrics.counter("agent_permission_timeouts_total", "Permission requests timed out")
+metrics.histogram(
+    "agent_permission_approval_seconds", "Time for the client to answer a permission"
+)
+
+# Input fields matched by "pattern" scoped decisions, in order of preference
+PATTERN_INPUT_KEYS = ("command", "file_path", "path", "pattern", "url")
+
+# Fields holding file system paths, normalised before matching
+PATH_INPUT_KEYS = frozenset({"file_path", "path"})
+
+# Cached scopes from most to least specific; the most specific decision wins
+SCOPES = ("input", "pattern", "tool")
+
+# A glob like "git *" would also match "git status; rm -rf ~", so subjects
+# that could chain or substitute shell commands never match a pattern
+SHELL_METACHARACTERS = frozenset(";&|$`<>\n\r")
+
+
+def _input_key(input_data: dict[str, Any]) -> str:
+    """Canonical string for an exact tool input."""
+    return json.dumps(input_data, sort_keys=True, default=str)
+
+
+def _pattern_subject(input_data: dict[str, Any]) -> str | None:
+    """
+    The input value "pattern" decisions are matched against, or None if it
+    must not match any pattern.
+
+    Values with shell metacharacters never match. Paths are normalised, so
+    "/var/task/../../root/x" is matched as "/root/x", and paths that still
+    climb out with ".." never match.
+    """
+    key, subject = next(
+        (
+            (key, value)
+            for key in PATTERN_INPUT_KEYS
+            if isinstance(value := input_data.get(key), str)
+        ),
+        ("", _input_key(input_data)),
+    )
+    if SHELL_METACHARACTERS.intersection(subject):
+        return None
+    if key in PATH_INPUT_KEYS:
+        subject = os.path.normpath(subject)
+        if os.pardir in subject.split(os.sep):
+            return None
+    return subject
+
+
+class PermissionPolicyCache:
+    """
+    Cached tool permission decisions with TTL and LRU eviction.
+
+    A decision applies to one of the scopes:
+    - once: not cached
+    - input: the same tool with exactly the same input
+    - pattern: the same tool whose command/path matches a glob pattern
+      (never for values containing shell metacharacters; paths are
+      normalised first)
+    - tool: every call of the tool for the rest of the session
+
+    Denials are cached the same way as approvals; decisions without an
+    explicit scope are not cached. When several decisions apply, the most
+    specific scope wins and within a scope a denial wins, regardless of
+    the order they were made or used in.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 900.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (scope, tool_name, key) -> (approved, expires_at)
+        self._entries: OrderedDict[tuple[str, str, str], tuple[bool, float]] = (
+            OrderedDict()
+        )
+
+    def lookup(self, tool_name: str, input_data: dict[str, Any]) -> bool | None:
+        """Return the cached decision for a call, or None if unknown."""
+        now = time.monotonic()
+        input_key = _input_key(input_data)
+        subject: str | None = None
+        subject_checked = False
+        # scope -> decisions of the unexpired entries that apply
+        decisions: dict[str, list[bool]] = {}
+        for entry_key, (approved, expires_at) in list(self._entries.items()):
+            scope, name, key = entry_key
+            if name != tool_name:
+                continue
+            if expires_at < now:
+                del self._entries[entry_key]
+                continue
+            if scope == "pattern":
+                if not subject_checked:
+                    subject = _pattern_subject(input_data)
+                    subject_checked = True
+                if subject is None or not fnmatch.fnmatchcase(subject, key):
+                    continue
+            elif scope == "input" and key != input_key:
+                continue
+            decisions.setdefault(scope, []).append(approved)
+            # Recency only decides eviction, never the decision
+            self._entries.move_to_end(entry_key)
+
+        for scope in SCOPES:
+            if scope in decisions:
+                return all(decisions[scope])
+        return None
+
+    def remember(
+        self,
+        tool_name: str,
+        input_data: dict[str, Any],
+        approved: bool,
+        scope: str = "once",
+        pattern: str | None = None,
+    ) -> None:
+        """Cache a decision for the given scope (unknown scopes: once)."""
+        if scope == "tool":
+            key = ""
+        elif scope == "pattern" and pattern:
+            key = pattern
+        elif scope == "input":
+            key = _input_key(input_data)
+        else:
+            return
+
+        entry_key = (scope, tool_name, key)
+        self._entries[entry_key] = (approved, time.monotonic() + self.ttl)
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class PermissionBroker:
+    """
+    can_use_tool callback that asks the client over a send function.
+
+    Requests are correlated by request_id, so several can be in flight while
+    other frames keep flowing. Cached decisions are answered without a
+    round-trip. Counters and approval latency are kept in stats.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[dict[str, Any]], Awaitable[None]],
+        cache: PermissionPolicyCache | None = None,
+        timeout: float = 30.0,
+    ):
+        self.send = send
+        self.cache = cache if cache is not None else PermissionPolicyCache()
+        self.timeout = timeout
+        self._pending: dict[str, tuple[asyncio.Future[dict[str, Any]], str]] = {}
+        self.stats = {
+            "requests": 0,
+            "cache_hits": 0,
+            "round_trips": 0,
+            "timeouts": 0,
+            "approval_seconds_total": 0.0,
+            "approval_seconds_max": 0.0,
+        }
+        self._turn_round_trips = 0
+
+    async def __call__(
+        self,
+        tool_name: str,
+        input_data: dict[str, Any],
+        tool_context: ToolPermissionContext,
+    ) -> PermissionResultAllow | PermissionResultDeny:
+        self.stats["requests"] += 1
+        metrics.inc("agent_permission_requests_total")
+
+        cached = self.cache.lookup(tool_name, input_data)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            metrics.inc("agent_permission_cache_hits_total")
+            log.info(f"Tool {tool_name} {'approved' if cached else 'denied'} (cached)")
+            return _result(cached, input_data, cached=True)
+
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = (future, tool_name)
+        self.stats["round_trips"] += 1
+        metrics.inc("agent_permission_round_trips_total")
+        self._turn_round_trips += 1
+        started = time.perf_counter()
+
+        log.info(f"Requesting permission for tool: {tool_name}")
+        try:
+            await self.send(
+                {
+                    "type": "tool_permission_request",
+                    "request_id": request_id,
+                    "tool_name": tool_name,
+                    "input": input_data,
+                }
+            )
+            response = await asyncio.wait_for(future, timeout=self.timeout)
+        except TimeoutError:
+            self.stats["timeouts"] += 1
+            metrics.inc("agent_permission_timeouts_total")
+            log.warning(f"Tool {tool_name} permission request timed out")
+            return PermissionResultDeny(
+                message=f"Permission request timed out ({self.timeout:g}s)"
+            )
+        finally:
+            self._pending.pop(request_id, None)
+
+        elapsed = time.perf_counter() - started
+        self.stats["approval_seconds_total"] += elapsed
+        self.stats["approval_seconds_max"] = max(
+            self.stats["approval_seconds_max"], elapsed
+        )
+        metrics.observe("agent_permission_approval_seconds", elapsed)
+
+        approved = bool(response.get("approved", False))
+        self.cache.remember(
+            tool_name,
+            input_data,
+            approved,
+            scope=response.get("scope", "once"),
+            pattern=response.get("pattern"),
+        )
+        log.info(f"Tool {tool_name} {'approved' if approved else 'denied'} by user")
+        return _result(approved, input_data)
+
+    def resolve(self, response: dict[str, Any]) -> bool:
+        """
+        Complete a pending request from a tool_permission_response frame.
+
+        Responses without a request_id answer the oldest pending request.
+        Returns False if no pending request matched.
+        """
+        request_id = response.get("request_id")
+        if request_id is None and self._pending:
+            request_id = next(iter(self._pending))
+        pending = self._pending.get(request_id)
+        if pending is None or pending[0].done():
+            log.warning(f"Unknown permission response: {request_id}")
+            return False
+        pending[0].set_result(response)
+        return True
+
+    def take_turn_round_trips(self) -> int:
+        """Return round-trips since the last call (one turn) and reset."""
+        count, self._turn_round_trips = self._turn_round_trips, 0
+        return count
+
+
+def _result(
+    approved: bool, input_data: dict[str, Any], cached: bool = False
+) -> PermissionResultAllow | PermissionResultDeny:
+    if approved:
+        return PermissionResultAllow(updated_input=input_data)
+    message = "User denied permission for this tool"
+    if cached:
+        message += " (remembered)"
+    return PermissionResultDeny(message=message)
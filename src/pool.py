@@ -0,0 +1,350 @@
+"""Pool of pre-warmed ClaudeSDKClient instances."""
+
+import asyncio
+import dataclasses
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from claude_agent_sdk import ClaudeAgentOptions, ClaudeSDKClient
+
+from src.log_utils import get_logger
+from src.options import options_fingerprint
+
+log = get_logger("pool")
+
+
+class PooledClient:
+    """
+    A connected ClaudeSDKClient owned by a dedicated background task.
+
+    The SDK enters and exits its task group inside connect()/disconnect(),
+    so both must run in the same task. The owner task keeps the client
+    connected until retire() is called, independently of the request tasks
+    that lease it.
+    """
+
+    def __init__(self, options: ClaudeAgentOptions, fingerprint: str):
+        self.options = options
+        self.fingerprint = fingerprint
+        self.session_id = options.resume
+        self.uses = 0
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.client: ClaudeSDKClient | None = None
+        # Cleared while leased or resetting, set once parked or retired
+        self.released = asyncio.Event()
+        self.released.set()
+        self._retired = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """
+        Spawn the CLI subprocess and wait for the init handshake.
+
+        If the caller is cancelled meanwhile, the client is retired and
+        disconnects as soon as it connected.
+        """
+        ready = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._run(ready))
+        try:
+            await ready
+        except BaseException:
+            self.retire()
+            raise
+
+    async def _run(self, ready: asyncio.Future) -> None:
+        try:
+            async with ClaudeSDKClient(options=self.options) as client:
+                self.client = client
+                if not ready.done():
+                    ready.set_result(None)
+                await self._retired.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                log.warning(f"Pooled client exited with error: {e}")
+        finally:
+            self.client = None
+            # Also when cancelled, so start() never waits forever
+            if not ready.done():
+                ready.set_exception(
+                    RuntimeError("Pooled client stopped before it was ready")
+                )
+
+    @property
+    def alive(self) -> bool:
+        return self.client is not None and not self._retired.is_set()
+
+    def retire(self) -> None:
+        """Disconnect in the background."""
+        self._retired.set()
+        self.released.set()
+
+    async def aclose(self) -> None:
+        """Disconnect and wait for the subprocess to exit."""
+        self.retire()
+        if self._task:
+            await self._task
+
+
+@dataclasses.dataclass
+class Lease:
+    """
+    A client handed out by ClientPool.lease().
+
+    The caller sets completed (and session_id, from ResultMessage) once the
+    turn finished, otherwise the client is discarded on release. tool_calls
+    is the number of tool calls of the last turn.
+    """
+
+    client: ClaudeSDKClient
+    session_id: str | None = None
+    completed: bool = False
+    tool_calls: int = 0
+
+
+class ClientPool:
+    """
+    Warm ClaudeSDKClient instances keyed by option fingerprint and session.
+
+    - Fresh clients (no conversation yet) are pre-warmed per fingerprint and
+      replenished in the background after each fresh lease
+    - After a completed turn the client is parked under the Claude session it
+      now holds, so a follow-up turn skips both the CLI start and the resume;
+      a client is never handed to a different conversation
+    - At most one live client holds a session: a turn for a session whose
+      client is leased or still resetting waits for it, and parking a client
+      retires any other idle client of its session (whose history is stale)
+    - On release the permission mode and model are reset to the options'
+      values; idle clients are health-checked before reuse
+    - Clients are recycled after max_uses leases or idle_ttl seconds idle
+
+    size is the maximum number of idle clients kept; 0 disables pooling.
+    """
+
+    def __init__(
+        self,
+        size: int = 4,
+        idle_ttl: float = 600.0,
+        max_uses: int = 20,
+        warm: int = 1,
+        health_check_after: float = 30.0,
+        health_check_timeout: float = 5.0,
+    ):
+        self.size = size
+        self.idle_ttl = idle_ttl
+        self.max_uses = max_uses
+        self.warm = warm
+        self.health_check_after = health_check_after
+        self.health_check_timeout = health_check_timeout
+        # Idle clients in least-recently-used order
+        self._idle: list[PooledClient] = []
+        self._leased: set[PooledClient] = set()
+        # Clients between start() and their first lease or park
+        self._starting: set[PooledClient] = set()
+        self._warming: dict[str, int] = {}
+        self._background: set[asyncio.Task] = set()
+
+    @asynccontextmanager
+    async def lease(
+        self, options: ClaudeAgentOptions, session_id: str | None = None
+    ) -> AsyncIterator[Lease]:
+        """Lease a connected client for one turn of session_id."""
+        fingerprint = options_fingerprint(options)
+        while True:
+            pooled = await self._acquire(fingerprint, session_id)
+            if pooled is not None or session_id is None:
+                break
+            busy = next((p for p in self._leased if p.session_id == session_id), None)
+            if busy is None:
+                break
+            # The previous turn's client is still starting, in use or resetting
+            await busy.released.wait()
+        if pooled is None:
+            log.info("Client pool miss, starting new client")
+            pooled = PooledClient(
+                dataclasses.replace(options, resume=session_id), fingerprint
+            )
+            self._claim(pooled)
+            try:
+                await self._start(pooled)
+            finally:
+                if not pooled.alive:
+                    self._leased.discard(pooled)
+        if session_id is None:
+            self._replenish(options, fingerprint)
+
+        lease = Lease(client=pooled.client, session_id=session_id)  # type: ignore[arg-type]
+        try:
+            yield lease
+        finally:
+            self._release(pooled, lease)
+
+    def holds(self, session_id: str) -> bool:
+        """
+        Whether a live client (idle or leased) has session_id in memory.
+
+        Such a client would not re-read the session jsonl, and may still be
+        appending to it.
+        """
+        return any(
+            p.alive and p.session_id == session_id for p in (*self._idle, *self._leased)
+        )
+
+    async def prewarm(self, options: ClaudeAgentOptions) -> None:
+        """Start fresh clients for options until the warm target is reached."""
+        fingerprint = options_fingerprint(options)
+        while self._fresh_count(fingerprint) < min(self.warm, self.size):
+            self._warming[fingerprint] = self._warming.get(fingerprint, 0) + 1
+            try:
+                pooled = PooledClient(
+                    dataclasses.replace(options, resume=None), fingerprint
+                )
+                await self._start(pooled)
+            finally:
+                self._warming[fingerprint] -= 1
+            self._park(pooled)
+
+    async def close(self) -> None:
+        """Disconnect all idle clients and those still starting."""
+        closing = [*self._idle, *self._starting]
+        self._idle = []
+        self._starting.clear()
+        await asyncio.gather(*(p.aclose() for p in closing), return_exceptions=True)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "idle": len(self._idle),
+            "fresh": sum(1 for p in self._idle if p.session_id is None),
+            "warming": sum(self._warming.values()),
+        }
+
+    async def _start(self, pooled: PooledClient) -> None:
+        self._starting.add(pooled)
+        try:
+            await pooled.start()
+        except BaseException:
+            # Retired, but possibly still connecting: close() waits for it
+            pooled._task.add_done_callback(  # type: ignore[union-attr]
+                lambda _: self._starting.discard(pooled)
+            )
+            raise
+        self._starting.discard(pooled)
+
+    async def _acquire(
+        self, fingerprint: str, session_id: str | None
+    ) -> PooledClient | None:
+        self._evict_expired()
+        while True:
+            candidates = [
+                p
+                for p in self._idle
+                if p.fingerprint == fingerprint and p.session_id == session_id
+            ]
+            if not candidates:
+                return None
+            pooled = candidates[-1]
+            self._idle.remove(pooled)
+            self._claim(pooled)
+            if await self._healthy(pooled):
+                log.info(f"Client pool hit (uses={pooled.uses})")
+                return pooled
+            log.warning("Discarding unhealthy pooled client")
+            self._leased.discard(pooled)
+            pooled.retire()
+
+    def _claim(self, pooled: PooledClient) -> None:
+        """Count pooled as leased, so other turns of its session wait for it."""
+        self._leased.add(pooled)
+        pooled.released.clear()
+
+    def _release(self, pooled: PooledClient, lease: Lease) -> None:
+        pooled.uses += 1
+        pooled.last_used = time.monotonic()
+        if (
+            self.size <= 0
+            or not lease.completed
+            or not pooled.alive
+            or pooled.uses >= self.max_uses
+        ):
+            self._leased.discard(pooled)
+            pooled.retire()
+            return
+        pooled.session_id = lease.session_id
+        self._spawn(self._reset_and_park(pooled))
+
+    async def _reset_and_park(self, pooled: PooledClient) -> None:
+        """
+        Restore per-lease client state before the client can be reused.
+
+        The client counts as leased until it is parked, so holds() sees it.
+        """
+        try:
+            async with asyncio.timeout(self.health_check_timeout):
+                await pooled.client.set_permission_mode(  # type: ignore[union-attr]
+                    pooled.options.permission_mode or "default"
+                )
+                await pooled.client.set_model(pooled.options.model)  # type: ignore[union-attr]
+        except Exception as e:
+            log.warning(f"Failed to reset pooled client: {e}")
+            pooled.retire()
+            return
+        finally:
+            self._leased.discard(pooled)
+        self._park(pooled)
+
+    def _park(self, pooled: PooledClient) -> None:
+        if pooled.session_id is not None:
+            for other in [p for p in self._idle if p.session_id == pooled.session_id]:
+                self._idle.remove(other)
+                other.retire()
+        self._idle.append(pooled)
+        pooled.released.set()
+        while len(self._idle) > self.size:
+            self._idle.pop(0).retire()
+
+    async def _healthy(self, pooled: PooledClient) -> bool:
+        if not pooled.alive:
+            return False
+        if time.monotonic() - pooled.last_used < self.health_check_after:
+            return True
+        # A control request round-trips through the CLI subprocess
+        try:
+            async with asyncio.timeout(self.health_check_timeout):
+                await pooled.client.set_permission_mode(  # type: ignore[union-attr]
+                    pooled.options.permission_mode or "default"
+                )
+        except Exception:
+            return False
+        return True
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for pooled in [p for p in self._idle if now - p.last_used > self.idle_ttl]:
+            self._idle.remove(pooled)
+            pooled.retire()
+
+    def _fresh_count(self, fingerprint: str) -> int:
+        idle = sum(
+            1
+            for p in self._idle
+            if p.fingerprint == fingerprint and p.session_id is None
+        )
+        return idle + self._warming.get(fingerprint, 0)
+
+    def _replenish(self, options: ClaudeAgentOptions, fingerprint: str) -> None:
+        if self.size > 0 and self._fresh_count(fingerprint) < self.warm:
+            self._spawn(self._prewarm_quietly(options))
+
+    async def _prewarm_quietly(self, options: ClaudeAgentOptions) -> None:
+        try:
+            await self.prewarm(options)
+        except Exception as e:
+            log.warning(f"Failed to pre-warm client: {e}")
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
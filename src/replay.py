@@ -0,0 +1,185 @@
+"""Record and replay Claude SDK message streams without network access."""
+
+import asyncio
+import dataclasses
+import gzip
+import json
+import time
+from collections.abc import AsyncIterator, Iterable
+from pathlib import Path
+from typing import Any
+
+from claude_agent_sdk import (
+    AssistantMessage,
+    Message,
+    ResultMessage,
+    SystemMessage,
+    TextBlock,
+    ThinkingBlock,
+    ToolResultBlock,
+    ToolUseBlock,
+    UserMessage,
+)
+from claude_agent_sdk.types import StreamEvent
+
+from src.log_utils import get_logger
+
+log = get_logger("replay")
+
+RECORDING_VERSION = 1
+
+# Dataclasses that may appear in a message stream, by class name
+MESSAGE_TYPES: dict[str, type] = {
+    cls.__name__: cls
+    for cls in (
+        AssistantMessage,
+        ResultMessage,
+        StreamEvent,
+        SystemMessage,
+        TextBlock,
+        ThinkingBlock,
+        ToolResultBlock,
+        ToolUseBlock,
+        UserMessage,
+    )
+}
+
+# A recorded turn: (seconds since the query was sent, message) pairs
+Recording = list[tuple[float, Message]]
+
+
+def encode(value: Any) -> Any:
+    """Convert a message to JSON-compatible data, tagging dataclasses by type."""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        encoded = {"__type__": type(value).__name__}
+        for field in dataclasses.fields(value):
+            encoded[field.name] = encode(getattr(value, field.name))
+        return encoded
+    if isinstance(value, list | tuple):
+        return [encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: encode(item) for key, item in value.items()}
+    return value
+
+
+def decode(value: Any) -> Any:
+    """Inverse of encode(); unknown fields are dropped."""
+    if isinstance(value, list):
+        return [decode(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    type_name = value.get("__type__")
+    if type_name is None:
+        return {key: decode(item) for key, item in value.items()}
+    cls = MESSAGE_TYPES[type_name]
+    names = {field.name for field in dataclasses.fields(cls)}
+    return cls(**{k: decode(v) for k, v in value.items() if k in names})
+
+
+def save_recording(path: Path, recording: Recording) -> None:
+    """Write a recording as gzip-compressed JSON lines."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps({"version": RECORDING_VERSION}) + "\n")
+        for offset, msg in recording:
+            line = json.dumps([round(offset, 6), encode(msg)], separators=(",", ":"))
+            f.write(line + "\n")
+
+
+def load_recording(path: Path) -> Recording:
+    """Read a recording written by save_recording()."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != RECORDING_VERSION:
+            raise ValueError(f"Unsupported recording version: {header}")
+        return [(offset, decode(data)) for offset, data in map(json.loads, f)]
+
+
+class MessageRecorder:
+    """
+    Captures a receive_response() stream and saves it when the turn ends.
+
+    Recordings are written to directory as <unix ms>-<session id>.jsonl.gz,
+    including turns that ended early.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    async def watch(self, messages: AsyncIterator[Message]) -> AsyncIterator[Message]:
+        started = time.perf_counter()
+        recording: Recording = []
+        try:
+            async for msg in messages:
+                recording.append((time.perf_counter() - started, msg))
+                yield msg
+        finally:
+            if recording:
+                self._save(recording)
+
+    def _save(self, recording: Recording) -> None:
+        session_id = next(
+            (
+                msg.session_id
+                for _, msg in reversed(recording)
+                if isinstance(msg, ResultMessage | StreamEvent)
+            ),
+            "unknown",
+        )
+        path = self.directory / f"{int(time.time() * 1000)}-{session_id}.jsonl.gz"
+        try:
+            save_recording(path, recording)
+        except Exception as e:
+            log.warning(f"Failed to save message recording {path}: {e}")
+        else:
+            log.info(f"Saved message recording: {path} ({len(recording)} messages)")
+
+
+def load_recordings(paths: Iterable[Path]) -> list[Recording]:
+    """
+    Load recordings from paths.
+
+    MessageRecorder is the only capture path: agentcore logs hold the
+    truncated, rate-limited MessageLogger output, which cannot be replayed.
+    """
+    return [load_recording(path) for path in paths]
+
+
+class ReplayClient:
+    """
+    Stand-in for ClaudeSDKClient that replays a recording.
+
+    speed scales the recorded timing (1.0 = as recorded, 2.0 = twice as fast);
+    0 replays at full speed without sleeping.
+    """
+
+    def __init__(self, recording: Recording, speed: float = 0.0):
+        self.recording = recording
+        self.speed = speed
+        self.prompts: list[str] = []
+        self.interrupted = False
+
+    async def __aenter__(self) -> "ReplayClient":
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        return None
+
+    async def query(self, prompt: str, session_id: str = "default") -> None:
+        self.prompts.append(prompt)
+
+    async def interrupt(self) -> None:
+        self.interrupted = True
+
+    async def receive_response(self) -> AsyncIterator[Message]:
+        started = time.perf_counter()
+        for offset, msg in self.recording:
+            if self.speed > 0:
+                delay = offset / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if self.interrupted:
+                return
+            yield msg
+            if isinstance(msg, ResultMessage):
+                return
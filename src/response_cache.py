@@ -0,0 +1,134 @@
+"""Prompt-level cache of the responses of stateless, tool-free turns."""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+
+from claude_agent_sdk import ClaudeAgentOptions
+
+from src.log_utils import get_logger
+from src.message import COST_PREFIX
+from src.metrics import registry as metrics
+from src.options import options_fingerprint
+
+log = get_logger("response_cache")
+
+metrics.counter("agent_response_cache_hits_total", "Prompts answered from the cache")
+metrics.counter("agent_response_cache_misses_total", "Cacheable prompts not cached")
+
+Responses = list[dict[str, Any]]
+
+# Replaces the cost frame of a recorded turn: a replay costs nothing
+CACHED_COST = {"result": f"{COST_PREFIX}0 (cached)"}
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace, so prompts differing only in spacing share a key."""
+    return " ".join(prompt.split())
+
+
+class ResponseCache:
+    """
+    LRU of recorded turn responses, with an optional directory tier.
+
+    Entries expire after ttl seconds (0 = never). The memory tier holds at
+    most max_entries turns; the directory tier (one gzip JSON file per key)
+    at most max_disk_entries, oldest files removed first. Disk hits are
+    promoted to memory; disk I/O runs in a worker thread.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 3600.0,
+        directory: Path | None = None,
+        max_disk_entries: int = 4096,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        # key -> (responses, created wall time)
+        self._entries: OrderedDict[str, tuple[Responses, float]] = OrderedDict()
+
+    def key(self, prompt: str, options: ClaudeAgentOptions) -> str:
+        fingerprint = options_fingerprint(options, stable=True)
+        payload = f"{fingerprint}\n{normalize_prompt(prompt)}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _fresh(self, created: float) -> bool:
+        return not self.ttl or time.time() - created < self.ttl
+
+    async def get(self, key: str) -> Responses | None:
+        entry = self._entries.get(key)
+        if entry is None and self.directory:
+            entry = await asyncio.to_thread(self._read, key)
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is None or not self._fresh(entry[1]):
+            self._entries.pop(key, None)
+            metrics.inc("agent_response_cache_misses_total")
+            return None
+        self._entries.move_to_end(key)
+        metrics.inc("agent_response_cache_hits_total")
+        return entry[0]
+
+    async def put(self, key: str, responses: Responses) -> None:
+        responses = [
+            CACHED_COST
+            if str(response.get("result", "")).startswith(COST_PREFIX)
+            else response
+            for response in responses
+        ]
+        entry = (responses, time.time())
+        self._remember(key, entry)
+        if self.directory:
+            try:
+                await asyncio.to_thread(self._write, key, entry)
+            except OSError as e:
+                log.warning(f"Failed to write response cache entry: {e}")
+
+    def _remember(self, key: str, entry: tuple[Responses, float]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json.gz"  # type: ignore[operator]
+
+    def _read(self, key: str) -> tuple[Responses, float] | None:
+        """Load a directory entry; unreadable or malformed files are removed."""
+        path = self._path(key)
+        try:
+            data = json.loads(gzip.decompress(path.read_bytes()))
+            return list(data["responses"]), float(data["created"])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning(f"Discarding bad response cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+    def _write(self, key: str, entry: tuple[Responses, float]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)  # type: ignore[union-attr]
+        path = self._path(key)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        payload = {"responses": entry[0], "created": entry[1]}
+        tmp_path.write_bytes(gzip.compress(json.dumps(payload).encode()))
+        os.replace(tmp_path, path)
+
+        files = list(self.directory.glob("*.json.gz"))  # type: ignore[union-attr]
+        if len(files) > self.max_disk_entries:
+            files.sort(key=lambda p: p.stat().st_mtime)
+            for old in files[: len(files) - self.max_disk_entries]:
+                old.unlink(missing_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
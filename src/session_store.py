@@ -0,0 +1,467 @@
+"""Session persistence for Claude Agent SDK jsonl files."""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any, Protocol
+
+from src.log_utils import get_logger
+
+try:
+    import zstandard
+
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+log = get_logger("session_store")
+
+PROJECTS_DIR = Path.home() / ".claude" / "projects" / "-var-task"
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Marker written by the Claude CLI when a conversation is compacted. Resume
+# only follows the message chain from the last boundary onwards.
+COMPACT_BOUNDARY_MARKER = b'"subtype":"compact_boundary"'
+
+
+class SessionBackend(Protocol):
+    """Storage for persisted session jsonl bytes."""
+
+    async def size(self, session_id: str) -> int:
+        """Return the number of bytes persisted for session_id (0 if none)."""
+        ...
+
+    async def append(self, session_id: str, data: bytes) -> None:
+        """Append data to the persisted session."""
+        ...
+
+    async def replace(self, session_id: str, data: bytes, start: int = 0) -> None:
+        """Replace the persisted bytes from offset start on with data."""
+        ...
+
+    def read(self, session_id: str, tail: bool = False) -> AsyncIterator[bytes]:
+        """
+        Yield the persisted session bytes in order.
+
+        With tail=True a backend may skip history that resume does not need.
+        """
+        ...
+
+
+class LocalDirectoryBackend:
+    """SessionBackend storing one <session_id>.jsonl file per session."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, session_id: str) -> Path:
+        return self.root / f"{session_id}.jsonl"
+
+    async def size(self, session_id: str) -> int:
+        path = self._path(session_id)
+        return path.stat().st_size if path.exists() else 0
+
+    async def append(self, session_id: str, data: bytes) -> None:
+        def _append() -> None:
+            with open(self._path(session_id), "ab") as f:
+                f.write(data)
+
+        await asyncio.to_thread(_append)
+
+    async def replace(self, session_id: str, data: bytes, start: int = 0) -> None:
+        def _replace() -> None:
+            path = self._path(session_id)
+            prefix = b""
+            if start:
+                with open(path, "rb") as f:
+                    prefix = f.read(start)
+            _atomic_write(path, [prefix, data])
+
+        await asyncio.to_thread(_replace)
+
+    async def read(self, session_id: str, tail: bool = False) -> AsyncIterator[bytes]:
+        path = self._path(session_id)
+        if not path.exists():
+            return
+        with open(path, "rb") as f:
+            while chunk := await asyncio.to_thread(f.read, READ_CHUNK_SIZE):
+                yield chunk
+
+
+class BlobStore(Protocol):
+    """Key/value storage for chunked session blobs (local dir, S3, ...)."""
+
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def put(self, key: str, data: bytes) -> None: ...
+
+    async def delete(self, key: str) -> None: ...
+
+
+class LocalBlobStore:
+    """BlobStore backed by a local directory."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    async def get(self, key: str) -> bytes | None:
+        path = self.root / key
+        if not path.exists():
+            return None
+        return await asyncio.to_thread(path.read_bytes)
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(_atomic_write, self.root / key, [data])
+
+    async def delete(self, key: str) -> None:
+        (self.root / key).unlink(missing_ok=True)
+
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _split_lines(data: bytes, chunk_size: int) -> list[bytes]:
+    """Split data into line-aligned pieces of at most chunk_size bytes."""
+    pieces = []
+    start = 0
+    while len(data) - start > chunk_size:
+        end = data.rfind(b"\n", start, start + chunk_size) + 1
+        if end <= start:
+            # A single line longer than chunk_size gets its own piece
+            end = data.find(b"\n", start + chunk_size) + 1 or len(data)
+        pieces.append(data[start:end])
+        start = end
+    if start < len(data):
+        pieces.append(data[start:])
+    return pieces
+
+
+class ChunkedSessionBackend:
+    """
+    SessionBackend storing sessions as compressed, line-aligned chunks.
+
+    Layout per session:
+    - <session_id>/manifest.json: codec, total size and per-chunk raw size,
+      stored size, sha256 and whether the chunk holds a compact boundary
+    - <session_id>/<index>-<sha256 prefix>.<codec>: compressed chunk
+
+    Appends only rewrite the last, partially filled chunk. Reads fetch
+    chunks in parallel (bounded by parallelism), verify their checksums and
+    yield decompressed chunks in order. With tail=True reading starts at the
+    last chunk containing a compact boundary.
+    """
+
+    def __init__(
+        self,
+        store: BlobStore,
+        chunk_size: int = 1024 * 1024,
+        codec: str | None = None,
+        parallelism: int = 8,
+    ):
+        self.store = store
+        self.chunk_size = chunk_size
+        self.codec = codec or ("zstd" if HAS_ZSTD else "gzip")
+        self.parallelism = parallelism
+        self._manifests: dict[str, dict[str, Any]] = {}
+        # Raw bytes of each session's last, partially filled chunk
+        self._open_chunks: dict[str, bytes] = {}
+
+    async def _manifest(self, session_id: str) -> dict[str, Any]:
+        manifest = self._manifests.get(session_id)
+        if manifest is None:
+            data = await self.store.get(f"{session_id}/manifest.json")
+            if data:
+                manifest = json.loads(data)
+            else:
+                manifest = {"version": 1, "size": 0, "chunks": []}
+            self._manifests[session_id] = manifest
+        return manifest
+
+    async def _put_chunk(
+        self, session_id: str, index: int, raw: bytes
+    ) -> dict[str, Any]:
+        digest = hashlib.sha256(raw).hexdigest()
+        stored = await asyncio.to_thread(_compress, self.codec, raw)
+        name = f"{index:06d}-{digest[:16]}.{self.codec}"
+        await self.store.put(f"{session_id}/{name}", stored)
+        return {
+            "name": name,
+            "codec": self.codec,
+            "raw_size": len(raw),
+            "stored_size": len(stored),
+            "sha256": digest,
+            "boundary": COMPACT_BOUNDARY_MARKER in raw,
+        }
+
+    async def _fetch_chunk(self, session_id: str, chunk: dict[str, Any]) -> bytes:
+        stored = await self.store.get(f"{session_id}/{chunk['name']}")
+        if stored is None:
+            raise FileNotFoundError(f"Missing session chunk: {chunk['name']}")
+        raw = await asyncio.to_thread(_decompress, chunk["codec"], stored)
+        if hashlib.sha256(raw).hexdigest() != chunk["sha256"]:
+            raise ValueError(f"Checksum mismatch for session chunk: {chunk['name']}")
+        return raw
+
+    async def _write(
+        self, session_id: str, manifest: dict[str, Any], data: bytes, start: int
+    ) -> None:
+        """Store data as chunks from index start on, then commit the manifest."""
+        pieces = _split_lines(data, self.chunk_size)
+        superseded = manifest["chunks"][start:]
+        new_chunks = await asyncio.gather(
+            *(
+                self._put_chunk(session_id, start + i, piece)
+                for i, piece in enumerate(pieces)
+            )
+        )
+        manifest["chunks"] = manifest["chunks"][:start] + list(new_chunks)
+        manifest["size"] = sum(c["raw_size"] for c in manifest["chunks"])
+        await self.store.put(
+            f"{session_id}/manifest.json", json.dumps(manifest).encode()
+        )
+        # Old blobs are only removed once the new manifest is committed
+        kept = {c["name"] for c in new_chunks}
+        for chunk in superseded:
+            if chunk["name"] not in kept:
+                await self.store.delete(f"{session_id}/{chunk['name']}")
+
+        last = pieces[-1] if pieces else b""
+        if last and len(last) < self.chunk_size:
+            self._open_chunks[session_id] = last
+        else:
+            self._open_chunks.pop(session_id, None)
+
+    async def size(self, session_id: str) -> int:
+        return (await self._manifest(session_id))["size"]
+
+    async def append(self, session_id: str, data: bytes) -> None:
+        manifest = await self._manifest(session_id)
+        chunks = manifest["chunks"]
+        start = len(chunks)
+        if chunks and chunks[-1]["raw_size"] < self.chunk_size:
+            # Refill the open chunk instead of adding a tiny one per turn
+            start -= 1
+            open_chunk = self._open_chunks.get(session_id)
+            if open_chunk is None:
+                open_chunk = await self._fetch_chunk(session_id, chunks[-1])
+            data = open_chunk + data
+        await self._write(session_id, manifest, data, start)
+
+    async def replace(self, session_id: str, data: bytes, start: int = 0) -> None:
+        """Replace from start on, which must be a chunk boundary (see read)."""
+        manifest = await self._manifest(session_id)
+        index = offset = 0
+        for chunk in manifest["chunks"]:
+            if offset >= start:
+                break
+            offset += chunk["raw_size"]
+            index += 1
+        if offset != start:
+            raise ValueError(f"Offset {start} is not a chunk boundary: {session_id}")
+        await self._write(session_id, manifest, data, index)
+
+    async def read(self, session_id: str, tail: bool = False) -> AsyncIterator[bytes]:
+        started = time.perf_counter()
+        self._manifests.pop(session_id, None)
+        manifest = await self._manifest(session_id)
+        manifest_ms = (time.perf_counter() - started) * 1000
+
+        chunks = manifest["chunks"]
+        first = 0
+        if tail:
+            boundaries = [i for i, c in enumerate(chunks) if c["boundary"]]
+            first = boundaries[-1] if boundaries else 0
+        selected = chunks[first:]
+
+        # Keep up to `parallelism` fetches in flight, yield strictly in order
+        pending: list[asyncio.Task] = []
+        raw = b""
+        raw_bytes = 0
+        try:
+            for chunk in selected:
+                pending.append(
+                    asyncio.create_task(self._fetch_chunk(session_id, chunk))
+                )
+                if len(pending) >= self.parallelism:
+                    raw = await pending.pop(0)
+                    raw_bytes += len(raw)
+                    yield raw
+            while pending:
+                raw = await pending.pop(0)
+                raw_bytes += len(raw)
+                yield raw
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if raw and len(raw) < self.chunk_size:
+            self._open_chunks[session_id] = raw
+
+        log.info(
+            "Chunked session read: session=%s chunks=%d/%d stored_bytes=%d "
+            "raw_bytes=%d skipped_bytes=%d manifest_ms=%.1f total_ms=%.1f",
+            session_id,
+            len(selected),
+            len(chunks),
+            sum(c["stored_size"] for c in selected),
+            raw_bytes,
+            sum(c["raw_size"] for c in chunks[:first]),
+            manifest_ms,
+            (time.perf_counter() - started) * 1000,
+        )
+
+
+def _tmp_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.tmp")
+
+
+def _atomic_write(path: Path, chunks: list[bytes]) -> int:
+    """Write chunks to path through a temp file and rename; return bytes written."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = _tmp_path(path)
+    written = 0
+    with open(tmp_path, "wb") as f:
+        for chunk in chunks:
+            written += f.write(chunk)
+    os.replace(tmp_path, path)
+    return written
+
+
+async def _stream_to_file(path: Path, chunks: AsyncIterator[bytes]) -> int:
+    """
+    Stream chunks into path through a temp file and rename.
+
+    Returns bytes written; nothing is created when chunks is empty.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = _tmp_path(path)
+    written = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            async for chunk in chunks:
+                written += await asyncio.to_thread(f.write, chunk)
+        if written:
+            os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return written
+
+
+class SessionPersister:
+    """
+    Persist session jsonl files incrementally.
+
+    The last persisted byte offset is tracked per session, so save() only
+    uploads complete lines appended since the previous save instead of the
+    whole history. With tail_restore the backend may restore only the part
+    of the history resume needs; the skipped prefix is remembered, so a
+    rewritten local file only replaces the restored part.
+    """
+
+    def __init__(
+        self,
+        backend: SessionBackend,
+        projects_dir: Path = PROJECTS_DIR,
+        tail_restore: bool = False,
+    ):
+        self.backend = backend
+        self.projects_dir = projects_dir
+        self.tail_restore = tail_restore
+        self._offsets: dict[str, int] = {}
+        # Persisted bytes before the local file's first byte (tail restore)
+        self._prefixes: dict[str, int] = {}
+        # Sessions whose local file was rewritten since the last save
+        self._rewritten: set[str] = set()
+
+    def session_path(self, session_id: str) -> Path:
+        return self.projects_dir / f"{session_id}.jsonl"
+
+    async def restore(self, session_id: str) -> bool:
+        """
+        Restore session_id from the backend if it is missing locally.
+
+        The file is written in a single streamed pass (temp file + rename).
+        Returns True if a session was restored.
+        """
+        path = self.session_path(session_id)
+        if path.exists():
+            if session_id not in self._offsets:
+                self._offsets[session_id] = await self.backend.size(session_id)
+            return False
+
+        started = time.perf_counter()
+        chunks = self.backend.read(session_id, tail=self.tail_restore)
+        written = await _stream_to_file(path, chunks)
+        if not written:
+            log.info(f"No persisted session found: {session_id}")
+            return False
+
+        self._offsets[session_id] = written
+        self._prefixes[session_id] = await self.backend.size(session_id) - written
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        log.info(
+            f"Session restored: {session_id} ({written} bytes, {elapsed_ms:.1f} ms)"
+        )
+        return True
+
+    def mark_rewritten(self, session_id: str) -> None:
+        """Upload the whole file on the next save (e.g. after compaction)."""
+        self._rewritten.add(session_id)
+
+    async def save(self, session_id: str) -> int:
+        """Upload lines appended since the last save; return bytes uploaded."""
+        path = self.session_path(session_id)
+        if not path.exists():
+            log.warning(f"Session file not found: {path}")
+            return 0
+
+        offset = self._offsets.get(session_id)
+        if offset is None:
+            offset = await self.backend.size(session_id)
+
+        size = path.stat().st_size
+        if size < offset or session_id in self._rewritten:
+            # The local file was rewritten (e.g. compacted): upload it whole,
+            # keeping the history a tail restore did not bring back
+            data = await asyncio.to_thread(path.read_bytes)
+            prefix = self._prefixes.get(session_id, 0)
+            await self.backend.replace(session_id, data, start=prefix)
+            self._rewritten.discard(session_id)
+            self._offsets[session_id] = len(data)
+            log.info(
+                f"Session replaced: {session_id} ({len(data)} bytes after {prefix})"
+            )
+            return len(data)
+
+        delta = await asyncio.to_thread(_read_complete_lines, path, offset)
+        if delta:
+            await self.backend.append(session_id, delta)
+        self._offsets[session_id] = offset + len(delta)
+        log.info(f"Session saved: {session_id} (+{len(delta)} bytes)")
+        return len(delta)
+
+
+def _read_complete_lines(path: Path, offset: int) -> bytes:
+    """Read from offset up to and including the last newline."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    return data[:end]
@@ -0,0 +1,119 @@
+"""
+Startup profiling: phase timings of module initialisation and import times.
+
+Usage (import-time report of src.main, like `python -X importtime`):
+    uv run python -m src.startup [--top N]
+"""
+
+import argparse
+import builtins
+import importlib
+import sys
+import time
+from typing import Any
+
+
+class StartupTimer:
+    """Durations of consecutive startup phases."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self._last = self.started
+
+    def mark(self, phase: str) -> None:
+        """Attribute the time since the previous mark to phase."""
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started
+
+    def summary(self) -> str:
+        phases = " ".join(
+            f"{name}_ms={seconds * 1000:.1f}" for name, seconds in self.phases.items()
+        )
+        return f"{phases} total_ms={self.total * 1000:.1f}"
+
+
+class ImportProfiler:
+    """
+    Self and cumulative time of each module imported while installed.
+
+    Wraps builtins.__import__, so modules loaded by importlib.import_module
+    or as `from package import submodule` are counted in their importer.
+    Not thread-safe; meant for a single-threaded startup.
+    """
+
+    def __init__(self):
+        self.cumulative: dict[str, float] = {}
+        self.self_time: dict[str, float] = {}
+        self._children: list[float] = []
+        self._original: Any = None
+
+    def install(self) -> None:
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self) -> None:
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+        self._children.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self._children.pop()
+            self.cumulative[name] = elapsed
+            self.self_time[name] = elapsed - children
+            if self._children:
+                self._children[-1] += elapsed
+
+    def report(self, top: int = 25) -> str:
+        """The slowest imports by cumulative time, in -X importtime columns."""
+        slowest = sorted(self.cumulative.items(), key=lambda item: -item[1])[:top]
+        lines = ["import time: self [ms] | cumulative [ms] | module"]
+        lines.extend(
+            f"import time: {self.self_time[name] * 1000:9.1f} | "
+            f"{seconds * 1000:15.1f} | {name}"
+            for name, seconds in slowest
+        )
+        return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("module", nargs="?", default="src.main")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    profiler = ImportProfiler()
+    started = time.perf_counter()
+    profiler.install()
+    try:
+        module = importlib.import_module(args.module)
+    finally:
+        profiler.uninstall()
+    elapsed = time.perf_counter() - started
+
+    print(profiler.report(args.top))
+    print(f"\nimport {args.module}: {elapsed * 1000:.1f} ms")
+    # Run as __main__, this module's StartupTimer is not the class the
+    # profiled module imported from src.startup
+    from src.startup import StartupTimer
+
+    startup = getattr(module, "startup", None)
+    if isinstance(startup, StartupTimer):
+        print(f"module initialisation: {startup.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Streaming helpers for Claude Agent SDK responses."""
+
+import asyncio
+import dataclasses
+from collections.abc import AsyncIterator
+from typing import Any
+
+from claude_agent_sdk.types import StreamEvent
+
+
+def _text_delta(msg: Any) -> str | None:
+    """Return the text of a text_delta StreamEvent, or None for anything else."""
+    if not isinstance(msg, StreamEvent):
+        return None
+    event = msg.event
+    if event.get("type") != "content_block_delta":
+        return None
+    delta = event.get("delta", {})
+    if delta.get("type") != "text_delta":
+        return None
+    return delta.get("text", "")
+
+
+def _merge(first: StreamEvent, texts: list[str]) -> StreamEvent:
+    """Build a single text_delta StreamEvent carrying all buffered text."""
+    delta = {"type": "text_delta", "text": "".join(texts)}
+    return dataclasses.replace(first, event={**first.event, "delta": delta})
+
+
+async def coalesce_text_deltas(
+    messages: AsyncIterator[Any],
+    max_bytes: int = 512,
+    max_delay: float = 0.03,
+) -> AsyncIterator[Any]:
+    """
+    Merge consecutive text_delta StreamEvents into larger chunks.
+
+    The first text_delta of every content block is passed through immediately,
+    so time-to-first-token is unchanged. Following deltas are buffered and
+    flushed as one StreamEvent when:
+    - the buffered text reaches max_bytes (UTF-8)
+    - max_delay seconds have passed since the first buffered delta
+    - any other message arrives (block boundary, tool use, result, ...)
+
+    All other messages are passed through unchanged and in order.
+    Setting max_bytes or max_delay to 0 disables coalescing.
+    """
+    if max_bytes <= 0 or max_delay <= 0:
+        async for msg in messages:
+            yield msg
+        return
+
+    loop = asyncio.get_running_loop()
+    iterator = aiter(messages)
+    first: StreamEvent | None = None
+    texts: list[str] = []
+    size = 0
+    deadline = 0.0
+    pass_through = True
+
+    # Keep the pending read in a task so a deadline flush never cancels it
+    next_msg = asyncio.ensure_future(anext(iterator))
+    try:
+        while True:
+            if first is not None:
+                timeout = max(deadline - loop.time(), 0.0)
+                done, _ = await asyncio.wait({next_msg}, timeout=timeout)
+                if not done:
+                    yield _merge(first, texts)
+                    first, texts, size = None, [], 0
+                    continue
+
+            try:
+                msg = await next_msg
+            except StopAsyncIteration:
+                break
+            next_msg = asyncio.ensure_future(anext(iterator))
+
+            text = _text_delta(msg)
+            if text is None:
+                # Block boundary or non-text message: flush before passing it on
+                if first is not None:
+                    yield _merge(first, texts)
+                    first, texts, size = None, [], 0
+                pass_through = True
+                yield msg
+                continue
+
+            if pass_through:
+                pass_through = False
+                yield msg
+                continue
+
+            if first is None:
+                first = msg
+                deadline = loop.time() + max_delay
+            texts.append(text)
+            size += len(text.encode())
+            if size >= max_bytes:
+                yield _merge(first, texts)
+                first, texts, size = None, [], 0
+
+        if first is not None:
+            yield _merge(first, texts)
+    finally:
+        next_msg.cancel()
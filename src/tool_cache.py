@@ -0,0 +1,103 @@
+"""Memoization of deterministic MCP tool results."""
+
+import functools
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from src.metrics import registry as metrics
+
+ToolHandler = Callable[[dict[str, Any]], Awaitable[dict[str, Any]]]
+
+metrics.counter("agent_tool_cache_hits_total", "Deterministic tool cache hits")
+metrics.counter("agent_tool_cache_misses_total", "Deterministic tool cache misses")
+
+
+def args_key(args: dict[str, Any]) -> str:
+    """Canonical hash of tool arguments (key order does not matter)."""
+    encoded = json.dumps(args, sort_keys=True, separators=(",", ":"), default=repr)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class ToolResultCache:
+    """
+    Size-bounded LRU of tool results with an optional TTL (0 = no expiry).
+
+    Results are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 0.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # key -> (result, expires_at)
+        self._entries: OrderedDict[str, tuple[dict[str, Any], float]] = OrderedDict()
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        entry = self._entries.get(key)
+        if entry is not None and (not self.ttl or entry[1] > time.monotonic()):
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, result: dict[str, Any]) -> None:
+        self._entries[key] = (result, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def deterministic(
+    max_entries: int | None = None, ttl: float | None = None
+) -> Callable[[ToolHandler], ToolHandler]:
+    """
+    Memoize a pure tool handler by its arguments.
+
+    Place it below @tool (and above @cpu_bound/@io_bound if used):
+
+        @tool("name", "description", {"a": int})
+        @deterministic()
+        async def name(args): ...
+
+    Defaults come from TOOL_CACHE_SIZE and TOOL_CACHE_TTL, read on first
+    call. Failed calls are not cached.
+    """
+
+    def decorator(handler: ToolHandler) -> ToolHandler:
+        name = handler.__name__
+
+        @functools.cache
+        def cache() -> ToolResultCache:
+            return ToolResultCache(
+                max_entries=max_entries or int(os.getenv("TOOL_CACHE_SIZE", "1024")),
+                ttl=ttl if ttl is not None else float(os.getenv("TOOL_CACHE_TTL", "0")),
+            )
+
+        @functools.wraps(handler)
+        async def wrapper(args: dict[str, Any]) -> dict[str, Any]:
+            key = args_key(args)
+            result = cache().get(key)
+            if result is not None:
+                metrics.inc("agent_tool_cache_hits_total", tool=name)
+                return result
+            metrics.inc("agent_tool_cache_misses_total", tool=name)
+            result = await handler(args)
+            cache().put(key, result)
+            return result
+
+        wrapper.cache = cache  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
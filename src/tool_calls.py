@@ -0,0 +1,71 @@
+"""Tracking of in-flight tool calls within a turn."""
+
+import dataclasses
+import sys
+import time
+from collections.abc import Callable
+
+from src.log_utils import get_logger
+
+log = get_logger("tool_calls")
+
+
+@dataclasses.dataclass(slots=True)
+class ToolCall:
+    """A tool call from its ToolUseBlock to its ToolResultBlock."""
+
+    name: str
+    started: float
+    ended: float | None = None
+
+    @property
+    def duration(self) -> float | None:
+        if self.ended is None:
+            return None
+        return self.ended - self.started
+
+
+class ToolCallTracker:
+    """
+    Maps tool_use_id to the pending ToolCall.
+
+    A call is dropped as soon as its result arrives, so memory is bounded by
+    the calls in flight rather than by the length of the turn. Tool names are
+    interned, and at most max_pending calls are kept (oldest evicted) in case
+    results never arrive. on_complete receives every finished call;
+    started counts the calls of the turn.
+    """
+
+    def __init__(
+        self,
+        on_complete: Callable[[ToolCall], None] | None = None,
+        max_pending: int = 256,
+    ):
+        self.on_complete = on_complete
+        self.max_pending = max_pending
+        self._pending: dict[str, ToolCall] = {}
+        self.started = 0
+
+    def start(self, tool_use_id: str, name: str) -> None:
+        """Register a call; repeated ToolUseBlocks for the same ID are ignored."""
+        if tool_use_id in self._pending:
+            return
+        self._pending[tool_use_id] = ToolCall(sys.intern(name), time.perf_counter())
+        self.started += 1
+        if len(self._pending) > self.max_pending:
+            evicted = next(iter(self._pending))
+            log.warning(f"Evicting tool call without result: {evicted}")
+            del self._pending[evicted]
+
+    def finish(self, tool_use_id: str) -> ToolCall | None:
+        """Complete and forget a call; None if it was never started."""
+        call = self._pending.pop(tool_use_id, None)
+        if call is None:
+            return None
+        call.ended = time.perf_counter()
+        if self.on_complete:
+            self.on_complete(call)
+        return call
+
+    def __len__(self) -> int:
+        return len(self._pending)
@@ -0,0 +1,214 @@
+"""Off-loop execution of MCP tool bodies (process pool / thread pool)."""
+
+import asyncio
+import functools
+import importlib
+import multiprocessing
+import os
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any
+
+from src.log_utils import get_logger
+from src.metrics import registry as metrics
+
+log = get_logger("tool_executor")
+
+ToolBody = Callable[[dict[str, Any]], dict[str, Any]]
+ToolHandler = Callable[[dict[str, Any]], Awaitable[dict[str, Any]]]
+
+CPU_BOUND = "cpu_bound"
+IO_BOUND = "io_bound"
+
+# Sync tool bodies by (module, qualname), so process workers can find them
+# after importing the module (the module attribute is replaced by @tool)
+_BODIES: dict[tuple[str, str], ToolBody] = {}
+
+metrics.gauge("agent_tool_executor_in_flight", "Tool calls submitted, not finished")
+metrics.gauge("agent_tool_executor_queue_depth", "Tool calls waiting for a free worker")
+metrics.histogram("agent_tool_queue_wait_seconds", "Time a tool call waited")
+metrics.histogram("agent_tool_exec_seconds", "Time a tool body ran in a worker")
+metrics.counter("agent_tool_exec_timeouts_total", "Tool calls that timed out")
+
+
+class ToolTimeoutError(TimeoutError):
+    """A tool body exceeded its timeout."""
+
+
+def _run_body(module: str, qualname: str, args: dict[str, Any]) -> tuple[Any, float]:
+    """Worker entry point: run a registered body; return (result, seconds)."""
+    body = _BODIES.get((module, qualname))
+    if body is None:
+        importlib.import_module(module)
+        body = _BODIES[(module, qualname)]
+    started = time.perf_counter()
+    result = body(args)
+    return result, time.perf_counter() - started
+
+
+def _import_modules(modules: list[str]) -> None:
+    """Worker warm-up: import the modules that register tool bodies."""
+    for module in modules:
+        importlib.import_module(module)
+
+
+class ToolExecutor:
+    """
+    Runs sync tool bodies on worker pools, off the event loop.
+
+    cpu_bound bodies run in a spawned process pool, io_bound bodies in a
+    thread pool. Pools are created on first use. Calls waiting for a worker
+    are cancelled with their caller. A cpu_bound call that times out while
+    running cannot be stopped individually, so the process pool is recycled;
+    other calls running on it fail.
+    """
+
+    def __init__(
+        self,
+        process_workers: int | None = None,
+        thread_workers: int = 8,
+        timeout: float = 30.0,
+    ):
+        self.process_workers = process_workers or min(4, os.cpu_count() or 1)
+        self.thread_workers = thread_workers
+        self.timeout = timeout
+        self._pools: dict[str, Executor] = {}
+        self._in_flight = {CPU_BOUND: 0, IO_BOUND: 0}
+
+    def _pool(self, kind: str) -> Executor:
+        pool = self._pools.get(kind)
+        if pool is None:
+            if kind == CPU_BOUND:
+                pool = ProcessPoolExecutor(
+                    self.process_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                pool = ThreadPoolExecutor(
+                    self.thread_workers, thread_name_prefix="tool"
+                )
+            self._pools[kind] = pool
+        return pool
+
+    def _workers(self, kind: str) -> int:
+        return self.process_workers if kind == CPU_BOUND else self.thread_workers
+
+    def _update_gauges(self, kind: str) -> None:
+        in_flight = self._in_flight[kind]
+        metrics.set("agent_tool_executor_in_flight", in_flight, kind=kind)
+        metrics.set(
+            "agent_tool_executor_queue_depth",
+            max(0, in_flight - self._workers(kind)),
+            kind=kind,
+        )
+
+    async def run(
+        self,
+        body: ToolBody,
+        args: dict[str, Any],
+        kind: str = CPU_BOUND,
+        timeout: float | None = None,
+    ) -> dict[str, Any]:
+        """Run body(args) on the pool for kind and return its result."""
+        timeout = timeout or self.timeout
+        name = body.__name__
+        submitted = time.perf_counter()
+        future = self._pool(kind).submit(
+            _run_body, body.__module__, body.__qualname__, args
+        )
+
+        self._in_flight[kind] += 1
+        self._update_gauges(kind)
+        try:
+            result, exec_seconds = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=timeout
+            )
+        except TimeoutError:
+            metrics.inc("agent_tool_exec_timeouts_total", tool=name, kind=kind)
+            if kind == CPU_BOUND and future.running():
+                self._recycle_process_pool()
+            raise ToolTimeoutError(
+                f"Tool {name} timed out after {timeout:g}s"
+            ) from None
+        finally:
+            self._in_flight[kind] -= 1
+            self._update_gauges(kind)
+
+        total = time.perf_counter() - submitted
+        metrics.observe(
+            "agent_tool_queue_wait_seconds", total - exec_seconds, kind=kind
+        )
+        metrics.observe("agent_tool_exec_seconds", exec_seconds, tool=name, kind=kind)
+        return result
+
+    async def warm(self, workers: int = 1) -> None:
+        """Start up to `workers` process workers with the tool modules imported."""
+        modules = sorted({module for module, _ in _BODIES})
+        count = min(workers, self.process_workers)
+        if not modules or count <= 0:
+            return
+        # Concurrent submissions each spawn a worker while none is idle
+        pool = self._pool(CPU_BOUND)
+        futures = [pool.submit(_import_modules, modules) for _ in range(count)]
+        await asyncio.gather(*map(asyncio.wrap_future, futures))
+
+    def _recycle_process_pool(self) -> None:
+        pool = self._pools.pop(CPU_BOUND, None)
+        if pool is None:
+            return
+        log.warning("Recycling tool process pool after a timeout")
+        # ProcessPoolExecutor has no public API to stop a running call
+        processes = list(getattr(pool, "_processes", {}).values())
+        pool.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.terminate()
+
+    def shutdown(self) -> None:
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pools.clear()
+
+
+@functools.cache
+def get_executor() -> ToolExecutor:
+    """Return the shared executor, configured from env on first use."""
+    workers = os.getenv("TOOL_PROCESS_WORKERS")
+    return ToolExecutor(
+        process_workers=int(workers) if workers else None,
+        thread_workers=int(os.getenv("TOOL_THREAD_WORKERS", "8")),
+        timeout=float(os.getenv("TOOL_TIMEOUT", "30")),
+    )
+
+
+def _offload(kind: str, timeout: float | None) -> Callable[[ToolBody], ToolHandler]:
+    def decorator(body: ToolBody) -> ToolHandler:
+        _BODIES[(body.__module__, body.__qualname__)] = body
+
+        @functools.wraps(body)
+        async def handler(args: dict[str, Any]) -> dict[str, Any]:
+            return await get_executor().run(body, args, kind=kind, timeout=timeout)
+
+        return handler
+
+    return decorator
+
+
+def cpu_bound(timeout: float | None = None) -> Callable[[ToolBody], ToolHandler]:
+    """
+    Run a sync, module-level tool body in the process pool.
+
+    Place it below @tool:
+
+        @tool("name", "description", {"values": list})
+        @cpu_bound(timeout=10)
+        def name(args): ...
+
+    Arguments and results must be picklable.
+    """
+    return _offload(CPU_BOUND, timeout)
+
+
+def io_bound(timeout: float | None = None) -> Callable[[ToolBody], ToolHandler]:
+    """Run a sync (blocking) tool body in the thread pool."""
+    return _offload(IO_BOUND, timeout)
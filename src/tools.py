@@ -1,11 +1,20 @@
 """Custom tools for Claude Agent SDK."""
 
+import functools
+import math
+import operator
 from typing import Any
 
-from claude_agent_sdk import create_sdk_mcp_server, tool
+from claude_agent_sdk import McpSdkServerConfig, create_sdk_mcp_server, tool
+
+from src.tool_cache import deterministic
+from src.tool_executor import cpu_bound
+
+_NUMBERS = {"type": "array", "items": {"type": "number"}}
 
 
 @tool("add_numbers", "Add two numbers together", {"a": int, "b": int})
+@deterministic()
 async def add_numbers(args: dict[str, Any]) -> dict[str, Any]:
     """Return the sum of two numbers"""
     result = args["a"] + args["b"]
@@ -15,6 +24,7 @@ async def add_numbers(args: dict[str, Any]) -> dict[str, Any]:
 
 
 @tool("multiply_numbers", "Multiply two numbers together", {"a": int, "b": int})
+@deterministic()
 async def multiply_numbers(args: dict[str, Any]) -> dict[str, Any]:
     """Return the product of two numbers"""
     result = args["a"] * args["b"]
@@ -23,7 +33,121 @@ async def multiply_numbers(args: dict[str, Any]) -> dict[str, Any]:
     }
 
 
-# Create SDK MCP server with custom tools
-tools_server = create_sdk_mcp_server(
-    name="custom_tools", version="1.0.0", tools=[add_numbers, multiply_numbers]
+def _numbers(args: dict[str, Any], key: str) -> list[int | float]:
+    values = args.get(key)
+    if not isinstance(values, list) or not values:
+        raise ValueError(f"{key} must be a non-empty array of numbers")
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, int | float):
+            raise ValueError(f"{key} must only contain numbers, got {value!r}")
+    return values
+
+
+def _all_ints(*arrays: list[int | float]) -> bool:
+    return all(type(value) is int for values in arrays for value in values)
+
+
+def _text(text: str) -> dict[str, Any]:
+    return {"content": [{"type": "text", "text": text}]}
+
+
+def _pair(args: dict[str, Any]) -> tuple[list[int | float], list[int | float]]:
+    a, b = _numbers(args, "a"), _numbers(args, "b")
+    if len(a) != len(b):
+        raise ValueError(f"a and b must have the same length ({len(a)} != {len(b)})")
+    return a, b
+
+
+@tool(
+    "sum_numbers",
+    "Sum an array of numbers in one call (use instead of repeated add_numbers)",
+    {"type": "object", "properties": {"values": _NUMBERS}, "required": ["values"]},
 )
+@deterministic()
+@cpu_bound()
+def sum_numbers(args: dict[str, Any]) -> dict[str, Any]:
+    """Return the sum of an array"""
+    values = _numbers(args, "values")
+    # Python ints are exact; fsum avoids accumulating float rounding errors
+    result = sum(values) if _all_ints(values) else math.fsum(values)
+    return _text(f"sum of {len(values)} values = {result}")
+
+
+@tool(
+    "product_numbers",
+    "Multiply an array of numbers in one call "
+    "(use instead of repeated multiply_numbers)",
+    {"type": "object", "properties": {"values": _NUMBERS}, "required": ["values"]},
+)
+@deterministic()
+@cpu_bound()
+def product_numbers(args: dict[str, Any]) -> dict[str, Any]:
+    """Return the product of an array"""
+    values = _numbers(args, "values")
+    result = math.prod(values)
+    return _text(f"product of {len(values)} values = {result}")
+
+
+@tool(
+    "dot_product",
+    "Dot product of two equal-length arrays of numbers",
+    {
+        "type": "object",
+        "properties": {"a": _NUMBERS, "b": _NUMBERS},
+        "required": ["a", "b"],
+    },
+)
+@deterministic()
+@cpu_bound()
+def dot_product(args: dict[str, Any]) -> dict[str, Any]:
+    """Return the dot product of two arrays"""
+    a, b = _pair(args)
+    products = map(operator.mul, a, b)
+    result = sum(products) if _all_ints(a, b) else math.fsum(products)
+    return _text(f"dot product of {len(a)} pairs = {result}")
+
+
+_ELEMENTWISE = {"add": operator.add, "subtract": operator.sub, "multiply": operator.mul}
+
+
+@tool(
+    "elementwise",
+    "Apply add, subtract or multiply to two equal-length arrays element by "
+    "element and return the resulting array",
+    {
+        "type": "object",
+        "properties": {
+            "op": {"type": "string", "enum": list(_ELEMENTWISE)},
+            "a": _NUMBERS,
+            "b": _NUMBERS,
+        },
+        "required": ["op", "a", "b"],
+    },
+)
+@deterministic()
+@cpu_bound()
+def elementwise(args: dict[str, Any]) -> dict[str, Any]:
+    """Return a op b for each pair of elements"""
+    op = _ELEMENTWISE.get(args.get("op", ""))
+    if op is None:
+        raise ValueError(f"op must be one of {', '.join(_ELEMENTWISE)}")
+    a, b = _pair(args)
+    result = list(map(op, a, b))
+    return _text(f"[{', '.join(map(str, result))}]")
+
+
+@functools.cache
+def get_tools_server() -> McpSdkServerConfig:
+    """Create the SDK MCP server with the custom tools on first use."""
+    return create_sdk_mcp_server(
+        name="custom_tools",
+        version="1.0.0",
+        tools=[
+            add_numbers,
+            multiply_numbers,
+            sum_numbers,
+            product_numbers,
+            dot_product,
+            elementwise,
+        ],
+    )